@@ -0,0 +1,296 @@
+# aggregates.py - Precomputed spend cube for the dashboard endpoints
+import numpy as np
+import pandas as pd
+
+from segments import append_values
+
+# Cube dimensions in key order: name -> source column
+CUBE_DIMENSIONS = {
+    'period': None,  # year/month, derived from input_date
+    'department': 'DEPARTMENT NAME',
+    'vendor': 'vendor_name',  # one label per canonical vendor, see vendors.py
+    'minority': 'MINORITY',
+    'woman': 'SB WOMAN',
+    'veteran': 'SB VETERAN',
+    'status': 'DOCUMENT STATUS DESCRIPTION',
+}
+
+# Dimensions stored as Y/N flags rather than raw values
+FLAG_DIMENSIONS = ('minority', 'woman', 'veteran')
+
+# Default N values of the top-N spend share curve
+CONCENTRATION_POINTS = (1, 5, 10, 20, 50, 100)
+
+
+def _dimension_values(df, dim):
+    """Return the raw per-row values for a cube dimension"""
+    if dim == 'period':
+        # year * 100 + month, NaN where the date could not be parsed
+        return (df['year'] * 100 + df['month']).to_numpy(dtype=float)
+    column = CUBE_DIMENSIONS[dim]
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    if dim in FLAG_DIMENSIONS:
+        return (df[column] == 'Y').to_numpy()
+    return df[column]
+
+
+def _dimension_codes(df, dim):
+    """Sorted labels of a dimension and each row's code into them (missing last)"""
+    values = _dimension_values(df, dim)
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if categories.is_monotonic_increasing:
+            # Reuse the categorical codes instead of hashing every row again
+            codes = values.cat.codes.to_numpy().astype(np.int64)
+            labels = np.asarray(categories, dtype=object)
+            if (codes < 0).any():
+                codes[codes < 0] = len(labels)
+                labels = np.append(labels, np.nan)
+            return codes, labels
+    codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=False)
+    return codes, np.asarray(uniques)
+
+
+def _is_missing(labels):
+    """Mask of NaN/None labels, which groupby drops by default"""
+    return pd.isna(pd.Series(labels, dtype=object)).to_numpy()
+
+
+def _merge_labels(label_arrays):
+    """Sorted union of label arrays (missing last) and each array's code map into it"""
+    missing = [_is_missing(values) for values in label_arrays]
+    labels = np.unique(np.concatenate([values[~gone] for values, gone in zip(label_arrays, missing)]))
+    if any(gone.any() for gone in missing):
+        labels = np.append(labels, np.nan)
+    index = pd.Index(labels)
+    return labels, [index.get_indexer(values) for values in label_arrays]
+
+
+class SpendCube:
+    """Spend and transaction counts aggregated over every dimension combination.
+
+    Built once at load time; every query runs over the groups, not the rows.
+    """
+
+    def __init__(self, labels, group_codes, spend, count, row_group=None, row_amount=None):
+        self.labels = labels            # dim -> array of distinct values
+        self.group_codes = group_codes  # dim -> label code for each group
+        self.spend = spend              # total amount per group
+        self.count = count              # transactions per group
+        self.row_group = row_group      # group id of every source row
+        self.row_amount = row_amount    # total_amount_clean of every source row
+        self._label_totals = {}         # dim -> (spend, count) per label, filled on demand
+        self._present_spend = {}        # dim -> (label ids, spend) of present labels, on demand
+
+    @classmethod
+    def from_frame(cls, df):
+        """Aggregate a cleaned purchase frame into a cube"""
+        labels = {}
+        row_codes = []
+        for dim in CUBE_DIMENSIONS:
+            codes, labels[dim] = _dimension_codes(df, dim)
+            row_codes.append(codes)
+
+        shape = tuple(max(len(labels[dim]), 1) for dim in CUBE_DIMENSIONS)
+        if len(df):
+            keys = np.ravel_multi_index(row_codes, shape)
+        else:
+            keys = np.zeros(0, dtype=np.int64)
+        group_keys, row_group = np.unique(keys, return_inverse=True)
+        amounts = df['total_amount_clean'].to_numpy(dtype=float)
+
+        spend = np.bincount(row_group, weights=amounts, minlength=len(group_keys))
+        count = np.bincount(row_group, minlength=len(group_keys))
+        group_codes = dict(zip(CUBE_DIMENSIONS, np.unravel_index(group_keys, shape)))
+        return cls(labels, group_codes, spend, count, row_group, amounts)
+
+    def append(self, df):
+        """Cube over the source rows followed by a cleaned frame's rows.
+
+        Existing groups keep their ids and only the new rows are coded and
+        counted, so the cost follows the size of df rather than the history.
+        The per-row arrays keep the source rows' arrays as they are and hold
+        the new rows' beside them (see segments.py).
+        """
+        cube, row_group = self.fold(df)
+        cube.row_group = append_values(self.row_group, row_group)
+        cube.row_amount = append_values(self.row_amount, df['total_amount_clean'].to_numpy(dtype=float))
+        return cube
+
+    def fold(self, df):
+        """Cube totals with a cleaned frame's rows added, and those rows' group ids.
+
+        The returned cube has no per-row arrays; append attaches them.
+        """
+        added = SpendCube.from_frame(df)
+        cube, (group_ids,) = self.merge([added])
+        return cube, group_ids[added.row_group]
+
+    def merge(self, partials):
+        """Cube totals with other cubes' groups added, and each one's group id map.
+
+        Groups of this cube keep their ids and new ones are numbered after
+        them. This cube's groups are walked once however many partials are
+        merged, so the streaming loader folds chunk cubes in batches (see
+        streaming.py) rather than rebuilding the totals for every chunk.
+        """
+        labels = {}
+        group_codes = []    # this cube's groups, coded into the merged labels
+        partial_codes = []  # every partial's groups, likewise, one after another
+        for dim in CUBE_DIMENSIONS:
+            labels[dim], maps = _merge_labels([self.labels[dim]] + [partial.labels[dim] for partial in partials])
+            group_codes.append(maps[0][self.group_codes[dim]])
+            partial_codes.append(np.concatenate([
+                code_map[partial.group_codes[dim]] for code_map, partial in zip(maps[1:], partials)
+            ]))
+
+        shape = tuple(max(len(labels[dim]), 1) for dim in CUBE_DIMENSIONS)
+        old_keys = np.ravel_multi_index(group_codes, shape)
+        new_keys, new_group = np.unique(np.ravel_multi_index(partial_codes, shape), return_inverse=True)
+
+        # Match the partials' keys against existing groups; the rest become new groups
+        order = np.argsort(old_keys)
+        pos = np.minimum(np.searchsorted(old_keys[order], new_keys), max(len(order) - 1, 0))
+        found = old_keys[order][pos] == new_keys if len(order) else np.zeros(len(new_keys), dtype=bool)
+        group_ids = np.empty(len(new_keys), dtype=np.int64)
+        group_ids[found] = order[pos[found]]
+        group_ids[~found] = self.group_count + np.arange(np.count_nonzero(~found))
+        group_count = self.group_count + np.count_nonzero(~found)
+
+        partial_group = group_ids[new_group]
+        spend = np.bincount(partial_group, weights=np.concatenate([partial.spend for partial in partials]),
+                            minlength=group_count)
+        count = np.bincount(partial_group, weights=np.concatenate([partial.count for partial in partials]),
+                            minlength=group_count).astype(np.int64)
+        spend[:self.group_count] += self.spend
+        count[:self.group_count] += self.count
+
+        added_codes = np.unravel_index(new_keys[~found], shape)
+        group_codes = {
+            dim: np.concatenate([codes, added])
+            for dim, codes, added in zip(CUBE_DIMENSIONS, group_codes, added_codes)
+        }
+        bounds = np.cumsum([partial.group_count for partial in partials])[:-1]
+        return SpendCube(labels, group_codes, spend, count), np.split(partial_group, bounds)
+
+    def restrict(self, row_chunks):
+        """Cube over a subset of the source rows, given as blocks of row ids"""
+        spend = np.zeros(self.group_count)
+        count = np.zeros(self.group_count, dtype=np.int64)
+        for rows in row_chunks:
+            groups = self.row_group[rows]
+            spend += np.bincount(groups, weights=self.row_amount[rows], minlength=self.group_count)
+            count += np.bincount(groups, minlength=self.group_count)
+        return SpendCube(self.labels, self.group_codes, spend, count)
+
+    @property
+    def group_count(self):
+        return len(self.spend)
+
+    def total_spend(self):
+        return float(self.spend.sum())
+
+    def total_count(self):
+        return int(self.count.sum())
+
+    def totals_by(self, dim):
+        """Spend, transaction count and a present mask per label of a dimension.
+
+        Computed once per cube and dimension; every panel that groups by the
+        same dimension shares the result. Labels that are missing or have no
+        transactions are masked out.
+        """
+        totals = self._label_totals.get(dim)
+        if totals is None:
+            labels = self.labels[dim]
+            spend = np.bincount(self.group_codes[dim], weights=self.spend, minlength=len(labels))
+            count = np.bincount(self.group_codes[dim], weights=self.count, minlength=len(labels)).astype(np.int64)
+            present = (count > 0) & ~_is_missing(labels)
+            totals = self._label_totals[dim] = (spend, count, present)
+        return totals
+
+    def spend_by(self, dim):
+        """Spend per label of a dimension, skipping missing and empty labels"""
+        spend, count, present = self.totals_by(dim)
+        return pd.Series(spend[present], index=self.labels[dim][present])
+
+    def count_by(self, dim):
+        """Transaction count per label of a dimension"""
+        spend, count, present = self.totals_by(dim)
+        return pd.Series(count[present], index=self.labels[dim][present])
+
+    def distinct(self, dim):
+        """Number of distinct non-missing labels present in the cube"""
+        return int(np.count_nonzero(self.totals_by(dim)[2]))
+
+    def flag_spend(self, dim):
+        """Spend on groups where a Y/N flag dimension is set; a missing flag counts as not set"""
+        spend, _, present = self.totals_by(dim)
+        # Compared as objects so NaN labels (column absent, or missing in appended rows) are False
+        is_set = present & (np.asarray(self.labels[dim], dtype=object) == True)
+        return float(spend[is_set].sum())
+
+    def present_spend(self, dim):
+        """Ids and spend of the present labels of a dimension, as dense arrays"""
+        cached = self._present_spend.get(dim)
+        if cached is None:
+            spend, count, present = self.totals_by(dim)
+            ids = np.flatnonzero(present)
+            cached = self._present_spend[dim] = (ids, spend[ids])
+        return cached
+
+    def top_ids(self, dim, n):
+        """Label ids of the n largest labels of a dimension by spend, largest first.
+
+        Partial selection over the dense per-label spend array: O(labels)
+        instead of a full sort. Ties keep label order, as nlargest does.
+        """
+        ids, spend = self.present_spend(dim)
+        if n <= 0:
+            return ids[:0]
+        if n < len(ids):
+            kth = -np.partition(-spend, n - 1)[n - 1]
+            above = np.flatnonzero(spend > kth)
+            ties = np.flatnonzero(spend == kth)[:n - len(above)]
+            picked = np.concatenate([above, ties])
+        else:
+            picked = np.arange(len(ids))
+        return ids[picked[np.lexsort((picked, -spend[picked]))]]
+
+    def top(self, dim, n):
+        """Largest n labels of a dimension by spend"""
+        ids = self.top_ids(dim, n)
+        return pd.Series(self.totals_by(dim)[0][ids], index=self.labels[dim][ids])
+
+    def concentration(self, dim, points=CONCENTRATION_POINTS):
+        """How concentrated spend is across the labels of a dimension.
+
+        HHI is the sum of squared spend shares (0-10,000 scale); the share
+        curve gives the % of spend held by the top N labels for each N in
+        points. Negative totals (net refunds) count as zero spend.
+        """
+        spend = np.clip(self.present_spend(dim)[1], 0, None)
+        total = spend.sum()
+        points = [n for n in points if n > 0]
+        if total <= 0:
+            return {'labels': len(spend), 'hhi': 0.0, 'effective_labels': 0.0,
+                    'top_n': points, 'share_pct': [0.0] * len(points)}
+        hhi = float(np.dot(spend, spend) / (total * total))
+        k = min(max(points, default=0), len(spend))
+        largest = -np.sort(np.partition(-spend, k - 1)[:k]) if k else spend[:0]
+        cumulative = np.cumsum(largest) / total
+        return {
+            'labels': len(spend),
+            'hhi': hhi * 10_000,
+            'effective_labels': 1 / hhi,  # number of equal-sized labels with the same HHI
+            'top_n': points,
+            'share_pct': [float(cumulative[min(n, k) - 1] * 100) if k else 0.0 for n in points],
+        }
+
+    def monthly_spend(self):
+        """Spend per (year, month) in date order as 'YYYY-MM' labels"""
+        by_period = self.spend_by('period').sort_index()
+        periods = by_period.index.to_numpy(dtype=int)
+        labels = [f"{period // 100}-{period % 100:02d}" for period in periods]
+        return pd.Series(by_period.to_numpy(), index=labels)
@@ -1,67 +1,418 @@
 # app.py - Procurement Dashboard Backend
 import pandas as pd
 import numpy as np
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
+import cProfile
+import functools
+import hmac
+import io
 import json
 import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from filters import DIVERSITY_FLAGS, RowSelection, parse_filters
+from dataset import DatasetManager
+from timeseries import day_label, day_number
+from response_cache import CachedResponse, ResponseCache, body_etag, request_key
+from records import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, SORT_COLUMNS, SORT_ORDERS, bitmap_count,
+                     cursor_token, decode_cursor, encode_cursor)
+from export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, export_chunks
+from segments import take_rows
+from json_provider import FastJSONProvider
+from aggregates import CONCENTRATION_POINTS
+from process_memory import memory_usage
+from compute_pool import ComputePool, DeadlineExceeded, PoolSaturated
+from metrics import MetricsRegistry
+
+class TimedJSONProvider(FastJSONProvider):
+    """FastJSONProvider that books encoding time to the request's serialize phase"""
+
+    def response(self, *args, **kwargs):
+        with request_phase('serialize'):
+            return super().response(*args, **kwargs)
 
 # Create Flask app
 app = Flask(__name__)
-CORS(app, origins=["*"], methods=["GET", "POST", "OPTIONS"], allow_headers=["Content-Type"])
+# Encodes NumPy arrays, pandas Series and timestamps directly (orjson when installed)
+app.json = TimedJSONProvider(app)
+# Cross-origin access is read-only; POST /api/purchases is for same-origin feed clients with the append token
+CORS(app, origins=["*"], methods=["GET", "OPTIONS"], allow_headers=["Content-Type"])
 
 print("🚀 Starting Procurement Dashboard...")
 
-# Try to load data file
-try:
-    if os.path.exists('Purchase data.csv'):
-        df = pd.read_csv('Purchase data.csv')
-        print(f"✅ Loaded {len(df)} records from Purchase data.csv")
+# Where the cleaned dataset is cached between restarts; empty disables the cache
+DATA_CACHE_DIR = os.environ.get('DATA_CACHE_DIR', '.data_cache')
+PURCHASE_DATA_FILE = os.environ.get('PURCHASE_DATA_FILE', 'Purchase data.csv')
+# New records appended by the daily feed (or POST /api/purchases); empty disables appends
+PURCHASE_DELTA_FILE = os.environ.get('PURCHASE_DELTA_FILE', 'Purchase data.delta.csv')
+# POST /api/purchases is off unless PURCHASE_APPEND_API=1, and then needs
+# "Authorization: Bearer <PURCHASE_APPEND_TOKEN>"; with no token set it refuses every request
+PURCHASE_APPEND_API = os.environ.get('PURCHASE_APPEND_API', '0') == '1'
+PURCHASE_APPEND_TOKEN = os.environ.get('PURCHASE_APPEND_TOKEN', '')
+# 'memory' loads the whole extract; 'streaming' reads it in chunks into an on-disk
+# store under DATA_CACHE_DIR (for extracts larger than RAM; appends are disabled)
+DATA_MODE = os.environ.get('DATA_MODE', 'memory')
+# Rows read, cleaned and folded per chunk in streaming mode
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', '500000'))
+# Seconds between checks of the data file for a new extract; 0 disables hot reload
+DATA_RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', '60'))
+# Rendered API responses kept per worker for the current dataset version; 0 disables
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '512'))
+# Most vendors one typeahead request may return
+MAX_VENDOR_RESULTS = 50
+# Most vendors /api/charts/top_vendors may return, and share-curve points per request
+MAX_TOP_VENDORS = 100
+MAX_CONCENTRATION_POINTS = 50
+# Threads per worker running the aggregation routes (0 runs them on the request
+# thread), requests allowed to wait for one, and seconds a request waits at most
+COMPUTE_THREADS = int(os.environ.get('COMPUTE_THREADS', str(min(4, os.cpu_count() or 1))))
+COMPUTE_QUEUE = int(os.environ.get('COMPUTE_QUEUE', '8'))
+COMPUTE_DEADLINE = float(os.environ.get('COMPUTE_DEADLINE', '30'))
+# Requests sent with an X-Profile header (1, or a pstats sort key) get a cProfile
+# breakdown in place of their body; off unless REQUEST_PROFILING=1
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '0') == '1'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+PROFILE_LINES = 40
+# Routes that report live process state rather than the dataset, or stream
+UNCACHED_PATHS = ('/api/system/', '/api/export')
+
+# Load data file; the dataset, cube, filter indexes and totals live in one
+# immutable snapshot that is rebuilt in the background when the file changes
+# and extended incrementally as rows are appended to the delta file
+if DATA_MODE == 'streaming':
+    datasets = DatasetManager(PURCHASE_DATA_FILE, DATA_CACHE_DIR or '.data_cache', DATA_RELOAD_INTERVAL,
+                              stream_chunk_rows=STREAM_CHUNK_ROWS)
+elif DATA_MODE == 'memory':
+    datasets = DatasetManager(PURCHASE_DATA_FILE, DATA_CACHE_DIR, DATA_RELOAD_INTERVAL, PURCHASE_DELTA_FILE)
+else:
+    raise ValueError(f"Unknown DATA_MODE '{DATA_MODE}' (expected 'memory' or 'streaming')")
+datasets.load()
+if PURCHASE_APPEND_API and not PURCHASE_APPEND_TOKEN:
+    print("⚠️  PURCHASE_APPEND_API=1 but PURCHASE_APPEND_TOKEN is empty; POST /api/purchases refuses every request")
+
+@app.before_request
+def start_dataset_watcher():
+    # Started lazily so each gunicorn worker runs its own watcher after the fork
+    datasets.ensure_watcher()
+
+def current_dataset():
+    """Snapshot to use for the whole of the current request"""
+    return g.setdefault('dataset', datasets.current())
+
+def profiling_requested():
+    return REQUEST_PROFILING and PROFILE_HEADER in request.headers
+
+@contextmanager
+def request_phase(name):
+    """Add the time spent in the block to a phase of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+def record_phase(name, seconds):
+    phases = g.setdefault('phase_seconds', {})
+    phases[name] = phases.get(name, 0.0) + seconds
+
+def record_rows_selected(rows):
+    g.rows_selected = g.get('rows_selected', 0) + rows
+
+# One profiled request at a time; cProfile cannot run two profilers at once
+profile_lock = threading.Lock()
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if profiling_requested():
+        profile_lock.acquire()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def cacheable_request():
+    return (RESPONSE_CACHE_SIZE > 0 and request.method == 'GET' and request.path.startswith('/api/')
+            and not request.path.startswith(UNCACHED_PATHS) and not profiling_requested())
+
+@app.before_request
+def serve_cached_response():
+    """Answer repeated GETs for the same dataset version from the response cache"""
+    if not cacheable_request():
+        return None
+    g.cache_key = request_key(request.path, request.args)
+    entry = response_cache.get(current_dataset().version, g.cache_key)
+    if entry is None:
+        return None
+    g.cache_entry = entry
+    return Response(entry.body, mimetype=entry.mimetype)
+
+def stop_profiler():
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+    return profiler
+
+def profile_response(profiler, response):
+    """The request's cProfile breakdown as plain text, in place of its body"""
+    sort = request.headers.get(PROFILE_HEADER, '').strip().lower()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats(sort if sort in PROFILE_SORT_KEYS else 'cumulative').print_stats(PROFILE_LINES)
+    response.close()
+    profiled = Response(out.getvalue(), mimetype='text/plain')
+    profiled.headers['X-Profile-Status'] = str(response.status_code)
+    profiled.headers['Server-Timing'] = response.headers.get('Server-Timing', '')
+    return profiled
+
+@app.after_request
+def record_request_metrics(response):
+    """Route timing and phase histograms, a Server-Timing header, and the profile if asked for"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    phases = g.pop('phase_seconds', {})
+    if phases:
+        # Whatever the handler spent outside the timed phases: cube views and payload building
+        phases['aggregate'] = max(elapsed - sum(phases.values()), 0.0)
+    response.headers['Server-Timing'] = ', '.join(
+        [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()] + [f'total;dur={elapsed * 1000:.2f}'])
+
+    profiler = stop_profiler()
+    if profiler is not None:
+        # Profiler overhead would skew the histograms; report this request on its own
+        return profile_response(profiler, response)
+    request_seconds.observe((route, request.method, response.status_code, response.headers.get('X-Cache', 'none')),
+                            elapsed)
+    for name, seconds in phases.items():
+        phase_seconds.observe((route, name), seconds)
+    if 'rows_selected' in g:
+        rows_selected.inc((route,), g.rows_selected)
+    return response
+
+@app.teardown_request
+def release_profiler(exc):
+    # A request that failed before its after_request hooks ran
+    stop_profiler()
+
+@app.after_request
+def store_cached_response(response):
+    """Cache fresh 200s, tag them with a strong ETag and honour If-None-Match"""
+    key = g.pop('cache_key', None)
+    if key is None:
+        return response
+    entry = g.pop('cache_entry', None)
+    response.headers['X-Cache'] = 'HIT' if entry else 'MISS'
+    if entry is None:
+        if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+            return response
+        body = response.get_data()
+        entry = CachedResponse(body, response.mimetype, body_etag(body))
+        response_cache.put(current_dataset().version, key, entry)
+
+    # Browsers keep the body but revalidate every time; unchanged data costs a 304
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.make_conditional(request)
+    if response.status_code == 304:
+        response_cache.record_not_modified()
+    return response
+
+compute_pool = ComputePool(COMPUTE_THREADS, COMPUTE_QUEUE, COMPUTE_DEADLINE)
+
+def offloaded(view):
+    """Run a route's aggregation work on the compute pool.
+
+    The request thread only waits for the result, so the cheap routes
+    (pages, cached responses) keep being served while every compute
+    thread is busy. Cache hits are answered before the view is reached.
+    """
+    @functools.wraps(view)
+    def run_on_pool(*args, **kwargs):
+        # Profiled requests stay on the request thread, where their profiler runs
+        if COMPUTE_THREADS <= 0 or 'profiler' in g:
+            return view(*args, **kwargs)
+        submitted = time.perf_counter()
+        def timed_view():
+            record_phase('queue', time.perf_counter() - submitted)
+            return view(*args, **kwargs)
+        return compute_pool.run(timed_view)
+    return run_on_pool
+
+@app.errorhandler(PoolSaturated)
+def compute_saturated(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.errorhandler(DeadlineExceeded)
+def compute_deadline_exceeded(e):
+    return jsonify({'error': str(e)}), 504
+
+# Per-worker metrics served at /metrics
+metrics = MetricsRegistry('procurement_')
+request_seconds = metrics.histogram('request_duration_seconds', 'Time to answer a request',
+                                    ('route', 'method', 'status', 'cache'))
+phase_seconds = metrics.histogram('request_phase_seconds',
+                                  'Time per phase of answering a request: queue, filter, aggregate, serialize',
+                                  ('route', 'phase'))
+rows_selected = metrics.counter('rows_selected_total', 'Rows matched by the filter params of requests to a route',
+                                ('route',))
+
+def cache_counts():
+    stats = response_cache.stats()
+    return {(result,): stats[key] for result, key in (('hit', 'hits'), ('miss', 'misses'), ('not_modified', 'not_modified'))}
+
+def pool_outcomes():
+    stats = compute_pool.stats()
+    return {(outcome,): stats[outcome] for outcome in ('completed', 'rejected', 'timed_out', 'dropped')}
+
+metrics.collected('response_cache_lookups_total', 'Response cache lookups by result', cache_counts, ('result',), 'counter')
+metrics.collected('response_cache_hit_ratio', 'Share of response cache lookups that were hits',
+                  lambda: {(): response_cache.stats()['hit_ratio']})
+metrics.collected('response_cache_entries', 'Responses held in the cache', lambda: {(): response_cache.stats()['entries']})
+metrics.collected('response_cache_evictions_total', 'Responses evicted to stay within the size bound',
+                  lambda: {(): response_cache.stats()['evictions']}, kind='counter')
+metrics.collected('compute_pool_tasks_total', 'Compute pool requests by outcome', pool_outcomes, ('outcome',), 'counter')
+metrics.collected('compute_pool_running', 'Requests running on the compute pool', lambda: {(): compute_pool.stats()['running']})
+metrics.collected('compute_pool_queued', 'Requests waiting for a compute thread', lambda: {(): compute_pool.stats()['queued']})
+metrics.collected('dataset_records', 'Records in the dataset snapshot being served', lambda: {(): len(datasets.current().df)})
+metrics.collected('dataset_version', 'Version of the dataset snapshot being served', lambda: {(): datasets.current().version})
+metrics.collected('dataset_loads_total', 'Full dataset loads and reloads', lambda: {(): datasets.loads}, kind='counter')
+metrics.collected('dataset_load_seconds_total', 'Time spent in full dataset loads and reloads',
+                  lambda: {(): datasets.load_seconds_total}, kind='counter')
+metrics.collected('dataset_last_load_seconds', 'Duration of the latest full dataset load',
+                  lambda: {(): datasets.last_load_seconds})
+metrics.collected('dataset_appends_total', 'Batches of appended rows folded into the dataset',
+                  lambda: {(): datasets.appends}, kind='counter')
+metrics.collected('dataset_append_seconds_total', 'Time spent folding appended rows into the dataset',
+                  lambda: {(): datasets.append_seconds_total}, kind='counter')
+
+def select_rows(args, data):
+    """Rows matching the request's filter params, as a copy-free selection"""
+    return RowSelection(data.df, data.filter_index, data.cube, select_bitmap(args, data)[0], parse_filters(args))
+
+def select_bitmap(args, data):
+    """Filter bitmap of the request's filter params (None: every row) and its row count"""
+    with request_phase('filter'):
+        bitmap = data.filter_index.select(parse_filters(args))
+        rows = len(data.df) if bitmap is None else bitmap_count(bitmap)
+    record_rows_selected(rows)
+    return bitmap, rows
+
+def filtered_cube(args, data):
+    """Spend cube restricted to the rows matching the request's filter params"""
+    return select_rows(args, data).view
+
+def trend_series(args, data):
+    """Daily spend series for the request's filters and optional vendor.
+
+    No filter, one department or one diversity segment (and a vendor on
+    its own) come straight from the precomputed prefix sums; any other
+    combination is summed from the matching rows. dateRange only sets the
+    window, see trend_window.
+    """
+    ts = data.timeseries
+    filters = {name: value for name, value in parse_filters(args).items() if name != 'dateRange'}
+    vendor = (args.get('vendor') or '').strip()
+    if vendor:
+        # Any spelling of a vendor selects it, by canonical key
+        vendor = data.vendor_label(vendor)
+        if vendor is None:
+            return ts.rows_series([])
+    if vendor and not filters:
+        series = ts.vendor(vendor)
+        return series if series is not None else ts.rows_series([])
+    if not vendor:
+        series = segment_series(filters, ts)
+        if series is not None:
+            return series
+    chunks = data.filter_index.iter_rows(data.filter_index.select(filters))
+    if vendor:
+        groups = np.flatnonzero(data.cube.labels['vendor'][data.cube.group_codes['vendor']] == vendor)
+        chunks = (rows[np.isin(data.cube.row_group[rows], groups)] for rows in chunks)
+    return ts.rows_series(chunks)
+
+def segment_series(filters, ts):
+    """Precomputed daily series for no filter, one department or one diversity
+    segment (empty if the value never occurs); None for any other filter set"""
+    if not filters:
+        return ts.total
+    if list(filters) == ['department']:
+        series = ts.departments.get(filters['department'])
+    elif list(filters) == ['diversity'] and filters['diversity'] in DIVERSITY_FLAGS:
+        series = ts.diversity.get(filters['diversity'])
     else:
-        print("⚠️  Purchase data.csv not found. Creating sample data...")
-        # Create minimal sample data
-        sample_data = {
-            'TOTAL AMOUNT': ['$1000.00', '$2000.00', '$500.00'],
-            'VENDOR NAME 1': ['Sample Vendor A', 'Sample Vendor B', 'Sample Vendor C'],
-            'DEPARTMENT NAME': ['Finance', 'IT', 'HR'],
-            'INPUT DATE': ['08/01/2025', '08/15/2025', '08/28/2025'],
-            'MINORITY': ['Y', 'N', 'Y'],
-            'SB WOMAN': ['N', 'Y', 'N'],
-            'SB VETERAN': ['N', 'N', 'Y'],
-            'DOCUMENT STATUS DESCRIPTION': ['Posted', 'Posted', 'Posted']
-        }
-        df = pd.DataFrame(sample_data)
-        print("🔄 Using sample data for demonstration")
-    
-    # Clean money amounts
-    def clean_money(amount_str):
-        if pd.isna(amount_str):
-            return 0
-        try:
-            return float(str(amount_str).replace('$', '').replace(',', ''))
-        except:
-            return 0
-    
-    # Clean data
-    df['total_amount_clean'] = df['TOTAL AMOUNT'].apply(clean_money)
-    
-    # Convert dates
-    df['input_date'] = pd.to_datetime(df['INPUT DATE'], errors='coerce')
-    df['year'] = df['input_date'].dt.year
-    df['month'] = df['input_date'].dt.month
-    
-    # Calculate basic stats
-    total_spend = df['total_amount_clean'].sum()
-    total_transactions = len(df)
-    avg_transaction = total_spend / total_transactions if total_transactions > 0 else 0
-    unique_vendors = df['VENDOR NAME 1'].nunique()
-    
-    print(f"📊 Stats: ${total_spend:,.2f} total, {total_transactions} transactions, {unique_vendors} vendors")
-    
-except Exception as e:
-    print(f"❌ Error loading data: {e}")
-    df = pd.DataFrame()  # Empty dataframe
+        return None
+    return series if series is not None else ts.rows_series([])
+
+def selection_series(selection, data):
+    """Daily spend series over the rows of a RowSelection.
+
+    A selection by one department or diversity segment, within an optional
+    dateRange, reads the segment's precomputed series; only other
+    selections walk their rows.
+    """
+    ts = data.timeseries
+    if selection.bitmap is None:
+        return ts.total
+    if selection.filters is not None:
+        filters = {name: value for name, value in selection.filters.items() if name != 'dateRange'}
+        series = segment_series(filters, ts)
+        if series is not None:
+            if 'dateRange' not in selection.filters:
+                return series
+            low, high = data.filter_index.date_bounds(selection.filters['dateRange'])
+            if low is None:
+                return ts.rows_series([])
+            return series.clipped(day_number(low), day_number(high))
+    return ts.rows_series(selection.index.iter_rows(selection.bitmap))
+
+def trend_window(args, data):
+    """[start, end) day numbers of a trend: the data's range narrowed by
+    dateRange, start/end (YYYY-MM-DD, end exclusive) and period (ytd/mtd)"""
+    ts = data.timeseries
+    start, end = ts.first_day, ts.last_day + 1
+    date_range = parse_filters(args).get('dateRange')
+    if date_range:
+        low, high = data.filter_index.date_bounds(date_range)
+        if low is None:
+            return start, start
+        start, end = max(start, day_number(low)), min(end, day_number(high))
+    if args.get('start'):
+        start = max(start, day_number(args['start']))
+    if args.get('end'):
+        end = min(end, day_number(args['end']))
+
+    period = args.get('period')
+    if period and end > start:
+        # Relative to the last day in the window, like the ytd/lastN filters
+        as_of = pd.Timestamp(day_label(end - 1))
+        if period == 'ytd':
+            start = max(start, day_number(pd.Timestamp(as_of.year, 1, 1)))
+        elif period == 'mtd':
+            start = max(start, day_number(pd.Timestamp(as_of.year, as_of.month, 1)))
+        else:
+            raise ValueError(f"Unknown period '{period}'")
+    return start, max(start, end)
+
+def trailing_months(series, months=12):
+    """Monthly spend over the last months calendar months of a series"""
+    if series.n_days == 0:
+        return pd.Series(dtype=float)
+    end = series.last_day + 1
+    last_month = pd.Timestamp(day_label(series.last_day)).to_period('M')
+    start = max(series.first_day, day_number((last_month - (months - 1)).to_timestamp()))
+    return series.monthly(start, end)
 
 # API Routes
 @app.route('/')
@@ -99,230 +450,559 @@ def drill_down():
         <p><a href="/dashboard">Go back to Dashboard</a></p>
         """, 404
 
-@app.route('/api/summary')
-def get_summary():
+# Demo payloads shown when no dataset is loaded at all
+DEMO_SPEND_TREND = {
+    'labels': ['2025-01', '2025-02', '2025-03', '2025-04', '2025-05', '2025-06', '2025-07', '2025-08'],
+    'values': [383000000, 404000000, 352000000, 458000000, 391000000, 367000000, 421000000, 391000000]
+}
+DEMO_TOP_VENDORS = {
+    'labels': ['GRADY CRAWFORD CONSTRUCTION', 'REPUBLIC SERVICES INC', 'THE WORKFORCE GROUP LLC', 'WASTE MANAGEMENT', 'WHARTON-SMITH INC', 'HARD ROCK CONSTRUCTION'],
+    'values': [950000000, 644000000, 552000000, 460000000, 368000000, 92000000]
+}
+DEMO_DIVERSITY = {
+    'labels': ['Minority-Owned', 'Woman-Owned', 'Veteran-Owned', 'Other'],
+    'values': [2.6, 3.49, 0.25, 93.66]
+}
+DEMO_DEPARTMENTS = {
+    'labels': ['COMMUNITY DEVELOP', 'PUBLIC WORKS', 'AIRPORT', 'ENV SERV', 'UTILITIES'],
+    'values': [920000000, 613000000, 460000000, 368000000, 307000000]
+}
+
+def summary_payload(view):
+    """KPI summary for a (filtered) cube view"""
+    view_spend = view.total_spend()
+    view_transactions = view.total_count()
+    view_avg = view_spend / view_transactions if view_transactions > 0 else 0
+    
+    # Diversity metrics
+    minority_spend = view.flag_spend('minority')
+    woman_spend = view.flag_spend('woman')
+    veteran_spend = view.flag_spend('veteran')
+    
+    minority_pct = (minority_spend / view_spend * 100) if view_spend > 0 else 0
+    woman_pct = (woman_spend / view_spend * 100) if view_spend > 0 else 0
+    veteran_pct = (veteran_spend / view_spend * 100) if view_spend > 0 else 0
+    
+    # Top vendors
+    top_vendors = view.top('vendor', 5)
+    top_5_spend = top_vendors.sum()
+    vendor_concentration = (top_5_spend / view_spend * 100) if view_spend > 0 else 0
+    
+    return {
+        'total_spend': view_spend,
+        'total_transactions': view_transactions,
+        'avg_transaction': view_avg,
+        'unique_vendors': view.distinct('vendor'),
+        'vendor_concentration': vendor_concentration,
+        'vendor_hhi': view.concentration('vendor', ())['hhi'],
+        'diversity': {
+            'minority_spend_pct': minority_pct,
+            'woman_spend_pct': woman_pct,
+            'veteran_spend_pct': veteran_pct
+        },
+        'top_vendors': top_vendors.to_dict()
+    }
+
+def spend_trend_payload(view):
+    """Monthly spend chart; empty when the view has no dated spend"""
+    monthly_spend = view.monthly_spend()
+    return {
+        'labels': monthly_spend.index,
+        'values': monthly_spend.to_numpy()
+    }
+
+def period_trend_payload(args, data):
+    """YTD (per month) or MTD (per day) spend trend from the daily series"""
+    series = trend_series(args, data)
+    start, end = trend_window(args, data)
+    buckets = series.daily(start, end) if args.get('period') == 'mtd' else series.monthly(start, end)
+    return {
+        'labels': buckets.index,
+        'values': buckets.to_numpy()
+    }
+
+def top_vendors_payload(view, n=10):
+    """Top n vendors by spend"""
+    top_vendors = view.top('vendor', n)
+    return {
+        'labels': top_vendors.index,
+        'values': top_vendors.to_numpy()
+    }
+
+def diversity_payload(view):
+    """Share of spend by diversity flag"""
+    view_spend = view.total_spend()
+    minority_spend = view.flag_spend('minority')
+    woman_spend = view.flag_spend('woman')
+    veteran_spend = view.flag_spend('veteran')
+    other_spend = view_spend - minority_spend - woman_spend - veteran_spend
+    other_spend = max(0, other_spend)
+    
+    total = view_spend if view_spend > 0 else 1
+    
+    return {
+        'labels': ['Minority-Owned', 'Woman-Owned', 'Veteran-Owned', 'Other'],
+        'values': [
+            (minority_spend / total) * 100,
+            (woman_spend / total) * 100,
+            (veteran_spend / total) * 100,
+            (other_spend / total) * 100
+        ]
+    }
+
+def departments_payload(view):
+    """Spend per department, largest first"""
+    dept_spend = view.spend_by('department').sort_values(ascending=False)
+    return {
+        'labels': dept_spend.index,
+        'values': dept_spend.to_numpy()
+    }
+
+@app.route('/api/dashboard')
+@offloaded
+def get_dashboard():
+    """Every dashboard panel for one filter set in a single round-trip.
+
+    The filter selection and the restricted cube are computed once and
+    shared by all panels, which also share per-dimension group totals.
+    """
     try:
-        if df.empty:
+        data = current_dataset()
+        if data.empty:
             return jsonify({'error': 'No data available'})
         
-        # Diversity metrics
-        minority_spend = df[df['MINORITY'] == 'Y']['total_amount_clean'].sum()
-        woman_spend = df[df['SB WOMAN'] == 'Y']['total_amount_clean'].sum()
-        veteran_spend = df[df['SB VETERAN'] == 'Y']['total_amount_clean'].sum()
-        
-        minority_pct = (minority_spend / total_spend * 100) if total_spend > 0 else 0
-        woman_pct = (woman_spend / total_spend * 100) if total_spend > 0 else 0
-        veteran_pct = (veteran_spend / total_spend * 100) if total_spend > 0 else 0
-        
-        # Top vendors
-        top_vendors = df.groupby('VENDOR NAME 1')['total_amount_clean'].sum().nlargest(5)
-        top_5_spend = top_vendors.sum()
-        vendor_concentration = (top_5_spend / total_spend * 100) if total_spend > 0 else 0
-        
+        view = filtered_cube(request.args, data)
         return jsonify({
-            'total_spend': total_spend,
-            'total_transactions': total_transactions,
-            'avg_transaction': avg_transaction,
-            'unique_vendors': unique_vendors,
-            'vendor_concentration': vendor_concentration,
-            'diversity': {
-                'minority_spend_pct': minority_pct,
-                'woman_spend_pct': woman_pct,
-                'veteran_spend_pct': veteran_pct
-            },
-            'top_vendors': top_vendors.to_dict()
+            'summary': summary_payload(view),
+            'spend_trend': period_trend_payload(request.args, data) if request.args.get('period') else spend_trend_payload(view),
+            'top_vendors': top_vendors_payload(view),
+            'diversity': diversity_payload(view),
+            'departments': departments_payload(view)
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/summary')
+@offloaded
+def get_summary():
+    try:
+        data = current_dataset()
+        if data.empty:
+            return jsonify({'error': 'No data available'})
+        
+        return jsonify(summary_payload(filtered_cube(request.args, data)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/charts/spend_trend')
+@offloaded
 def get_spend_trend():
     try:
-        if df.empty or df['input_date'].isna().all():
+        data = current_dataset()
+        if data.empty:
             # Return demo data if no real data
-            return jsonify({
-                'labels': ['2025-01', '2025-02', '2025-03', '2025-04', '2025-05', '2025-06', '2025-07', '2025-08'],
-                'values': [383000000, 404000000, 352000000, 458000000, 391000000, 367000000, 421000000, 391000000]
-            })
+            return jsonify(DEMO_SPEND_TREND)
         
-        # Process real data
-        monthly_spend = df.groupby(['year', 'month'])['total_amount_clean'].sum().reset_index()
-        monthly_spend['date_label'] = (monthly_spend['year'].astype(str) + '-' + 
-                                     monthly_spend['month'].astype(str).str.zfill(2))
-        monthly_spend = monthly_spend.sort_values(['year', 'month'])
-        
-        return jsonify({
-            'labels': monthly_spend['date_label'].tolist(),
-            'values': monthly_spend['total_amount_clean'].tolist()
-        })
+        if request.args.get('period'):
+            # YTD/MTD toggle: real monthly or daily spend from the time-series index
+            return jsonify(period_trend_payload(request.args, data))
+        return jsonify(spend_trend_payload(filtered_cube(request.args, data)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in spend_trend: {e}")
-        # Return demo data on error
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/timeseries')
+@offloaded
+def get_timeseries():
+    """Spend for any date window (start/end, dateRange or period), per day or month"""
+    try:
+        data = current_dataset()
+        if data.empty:
+            return jsonify({'error': 'No data available'})
+        
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('day', 'month'):
+            return jsonify({'error': f"Unknown granularity '{granularity}'"}), 400
+        
+        series = trend_series(request.args, data)
+        start, end = trend_window(request.args, data)
+        total_spend, total_transactions = series.window(start, end)
+        buckets = series.daily(start, end) if granularity == 'day' else series.monthly(start, end)
         return jsonify({
-            'labels': ['2025-01', '2025-02', '2025-03', '2025-04', '2025-05', '2025-06', '2025-07', '2025-08'],
-            'values': [383000000, 404000000, 352000000, 458000000, 391000000, 367000000, 421000000, 391000000]
+            'start': day_label(start),
+            'end': day_label(end),
+            'granularity': granularity,
+            'total_spend': total_spend,
+            'total_transactions': total_transactions,
+            'labels': buckets.index,
+            'values': buckets.to_numpy()
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/charts/top_vendors')
+@offloaded
 def get_top_vendors():
     try:
-        if df.empty:
-            return jsonify({
-                'labels': ['GRADY CRAWFORD CONSTRUCTION', 'REPUBLIC SERVICES INC', 'THE WORKFORCE GROUP LLC', 'WASTE MANAGEMENT', 'WHARTON-SMITH INC', 'HARD ROCK CONSTRUCTION'],
-                'values': [950000000, 644000000, 552000000, 460000000, 368000000, 92000000]
-            })
+        data = current_dataset()
+        if data.empty:
+            return jsonify(DEMO_TOP_VENDORS)
         
-        top_vendors = df.groupby('VENDOR NAME 1')['total_amount_clean'].sum().nlargest(10)
-        return jsonify({
-            'labels': top_vendors.index.tolist(),
-            'values': top_vendors.values.tolist()
-        })
+        limit = request.args.get('limit', '10')
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_TOP_VENDORS:
+            return jsonify({'error': f"limit must be between 1 and {MAX_TOP_VENDORS}"}), 400
+        return jsonify(top_vendors_payload(filtered_cube(request.args, data), int(limit)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in top_vendors: {e}")
-        return jsonify({
-            'labels': ['GRADY CRAWFORD CONSTRUCTION', 'REPUBLIC SERVICES INC', 'THE WORKFORCE GROUP LLC', 'WASTE MANAGEMENT', 'WHARTON-SMITH INC', 'HARD ROCK CONSTRUCTION'],
-            'values': [950000000, 644000000, 552000000, 460000000, 368000000, 92000000]
-        })
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/charts/diversity')
+@offloaded
 def get_diversity_chart():
     try:
-        if df.empty:
-            return jsonify({
-                'labels': ['Minority-Owned', 'Woman-Owned', 'Veteran-Owned', 'Other'],
-                'values': [2.6, 3.49, 0.25, 93.66]
-            })
-        
-        minority_spend = df[df['MINORITY'] == 'Y']['total_amount_clean'].sum()
-        woman_spend = df[df['SB WOMAN'] == 'Y']['total_amount_clean'].sum()
-        veteran_spend = df[df['SB VETERAN'] == 'Y']['total_amount_clean'].sum()
-        other_spend = total_spend - minority_spend - woman_spend - veteran_spend
-        other_spend = max(0, other_spend)
-        
-        total = total_spend if total_spend > 0 else 1
+        data = current_dataset()
+        if data.empty:
+            return jsonify(DEMO_DIVERSITY)
         
-        return jsonify({
-            'labels': ['Minority-Owned', 'Woman-Owned', 'Veteran-Owned', 'Other'],
-            'values': [
-                (minority_spend / total) * 100,
-                (woman_spend / total) * 100,
-                (veteran_spend / total) * 100,
-                (other_spend / total) * 100
-            ]
-        })
+        return jsonify(diversity_payload(filtered_cube(request.args, data)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in diversity: {e}")
-        return jsonify({
-            'labels': ['Minority-Owned', 'Woman-Owned', 'Veteran-Owned', 'Other'],
-            'values': [2.6, 3.49, 0.25, 93.66]
-        })
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/departments')
+@offloaded
 def get_departments():
     try:
-        if df.empty:
-            return jsonify({
-                'labels': ['COMMUNITY DEVELOP', 'PUBLIC WORKS', 'AIRPORT', 'ENV SERV', 'UTILITIES'],
-                'values': [920000000, 613000000, 460000000, 368000000, 307000000]
-            })
+        data = current_dataset()
+        if data.empty:
+            return jsonify(DEMO_DEPARTMENTS)
         
-        dept_spend = df.groupby('DEPARTMENT NAME')['total_amount_clean'].sum().sort_values(ascending=False)
-        return jsonify({
-            'labels': dept_spend.index.tolist(),
-            'values': dept_spend.values.tolist()
-        })
+        return jsonify(departments_payload(filtered_cube(request.args, data)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in departments: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/vendors/search')
+def search_vendors():
+    """Typeahead: vendors matching q by name prefix, then by similar spelling, with their spend"""
+    try:
+        data = current_dataset()
+        limit = request.args.get('limit', '10')
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_VENDOR_RESULTS:
+            raise ValueError(f"limit must be between 1 and {MAX_VENDOR_RESULTS}")
+        query = request.args.get('q', '')
+        results = data.vendor_search.search(query, int(limit)) if not data.empty else []
+        return jsonify({'query': query, 'results': results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/vendors/concentration')
+@offloaded
+def get_vendor_concentration():
+    """HHI and top-N share curve of vendor spend for the filtered rows.
+
+    points is a comma-separated list of N (default 1,5,10,20,50,100).
+    """
+    try:
+        data = current_dataset()
+        if data.empty:
+            return jsonify({'error': 'No data available'})
+        
+        points = request.args.get('points')
+        if points:
+            if not all(n.strip().isdigit() for n in points.split(',')):
+                raise ValueError('points must be comma-separated positive integers')
+            points = [int(n) for n in points.split(',')][:MAX_CONCENTRATION_POINTS]
+        else:
+            points = CONCENTRATION_POINTS
+        return jsonify(filtered_cube(request.args, data).concentration('vendor', points))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/system/memory')
+def get_memory_usage():
+    """Memory footprint of the worker serving this request"""
+    usage = memory_usage()
+    if usage is None:
+        return jsonify({'error': 'Memory accounting needs /proc (Linux)'}), 501
+    return jsonify(usage)
+
+@app.route('/api/system/dataset')
+def get_dataset_status():
+    """Version and freshness of the dataset snapshot this worker is serving"""
+    data = current_dataset()
+    return jsonify({
+        'version': data.version,
+        'source': datasets.path,
+        'delta_source': datasets.delta_path,
+        'delta_offset': data.delta[1],
+        'records': len(data.df),
+        'mode': 'streaming' if data.out_of_core else 'memory',
+        'loaded_at': datetime.fromtimestamp(data.loaded_at).isoformat(timespec='seconds'),
+        'reload_interval': datasets.interval,
+        'last_error': datasets.last_error
+    })
+
+@app.route('/api/system/cache')
+def get_cache_stats():
+    """Hit/miss counters of this worker's response cache"""
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics')
+def get_metrics():
+    """This worker's request, phase, cache, compute pool and dataset metrics (Prometheus text format)"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/system/compute')
+def get_compute_stats():
+    """Load and admission counters of this worker's compute pool"""
+    return jsonify(compute_pool.stats())
+
+@app.route('/api/purchases', methods=['POST'])
+def append_purchases():
+    """Append new purchase records (raw CSV column names and values)"""
+    if not PURCHASE_APPEND_API:
+        return jsonify({'error': 'Not found'}), 404
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if (not PURCHASE_APPEND_TOKEN or scheme.lower() != 'bearer'
+            or not hmac.compare_digest(token.encode(), PURCHASE_APPEND_TOKEN.encode())):
+        return jsonify({'error': 'Unauthorized'}), 401, {'WWW-Authenticate': 'Bearer'}
+    try:
+        payload = request.get_json(silent=True)
+        records = payload.get('records') if isinstance(payload, dict) else payload
+        appended = datasets.append_records(records)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    data = current_dataset()
+    return jsonify({
+        'appended': appended,
+        'version': data.version,
+        'records': len(data.df)
+    })
+
+# Source column -> field name of a browsed record
+RECORD_FIELDS = {
+    'VENDOR NAME 1': 'vendor',
+    'DEPARTMENT NAME': 'department',
+    'total_amount_clean': 'amount',
+    'INPUT DATE': 'date',
+    'DOCUMENT STATUS DESCRIPTION': 'status',
+}
+
+# Diversity flag column -> label shown for a record
+DIVERSITY_LABELS = {'MINORITY': 'Minority', 'SB WOMAN': 'Woman-Owned', 'SB VETERAN': 'Veteran-Owned'}
+
+def record_rows(df, rows):
+    """API records for the given row ids, in that order"""
+    columns = [column for column in list(RECORD_FIELDS) + list(DIVERSITY_LABELS) if column in df.columns]
+    page = take_rows(df, rows, columns).astype(object)
+    page = page.where(page.notna(), None)
+    records = []
+    for row_id, values in zip(rows.tolist(), page.to_dict('records')):
+        record = {'row': row_id}
+        record.update({field: values.get(column) for column, field in RECORD_FIELDS.items()})
+        labels = [label for column, label in DIVERSITY_LABELS.items() if values.get(column) == 'Y']
+        record['diversity'] = ', '.join(labels) if labels else 'Non-Diverse'
+        records.append(record)
+    return records
+
+def page_size(args):
+    limit = args.get('limit', str(DEFAULT_PAGE_SIZE))
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return int(limit)
+
+@app.route('/api/records')
+@offloaded
+def get_records():
+    """One page of the filtered purchase records, sorted by amount, date or vendor.
+
+    Page with offset=N, or pass back next_cursor as cursor=...; cursors
+    resume in place, so deep pages cost the same as the first one.
+    """
+    try:
+        data = current_dataset()
+        if data.empty:
+            return jsonify({'records': [], 'total': 0, 'next_cursor': None})
+        
+        sort = request.args.get('sort', 'date')
+        order = request.args.get('order', 'desc')
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort '{sort}'")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"Unknown order '{order}'")
+        limit = page_size(request.args)
+        offset = request.args.get('offset', '0')
+        if not offset.isdigit():
+            raise ValueError('offset must be a non-negative integer')
+        
+        filters = parse_filters(request.args)
+        bitmap, total = select_bitmap(request.args, data)
+        token = cursor_token(data.tag, sort, order, filters)
+        cursor = request.args.get('cursor')
+        # One row past the page tells whether there is a next one
+        if cursor:
+            rows, position = data.sort_index.page(sort, order, bitmap, decode_cursor(cursor, token), limit + 1)
+        else:
+            rows, position = data.sort_index.page(sort, order, bitmap, 0, limit + 1, skip=int(offset))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
         return jsonify({
-            'labels': ['COMMUNITY DEVELOP', 'PUBLIC WORKS', 'AIRPORT', 'ENV SERV', 'UTILITIES'],
-            'values': [920000000, 613000000, 460000000, 368000000, 307000000]
+            'records': record_rows(data.df, rows),
+            'total': total,
+            'offset': None if cursor else int(offset),
+            'limit': limit,
+            'sort': sort,
+            'order': order,
+            # page() returns the position after the extra row, so the next page resumes at that row
+            'next_cursor': encode_cursor(position - 1, token) if has_more else None
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export')
+def export_records():
+    """Stream every record matching the filter params as CSV or NDJSON.
+
+    Optional sort/order use the same orders as /api/records; without them
+    rows come out in extract order.
+    """
+    try:
+        data = current_dataset()
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'")
+        sort = request.args.get('sort')
+        order = request.args.get('order', 'asc')
+        if sort is not None and sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort '{sort}'")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"Unknown order '{order}'")
+        
+        if data.empty:
+            blocks, total = [], 0
+        else:
+            bitmap, total = select_bitmap(request.args, data)
+            if sort:
+                blocks = data.sort_index.iter_rows(sort, order, bitmap, EXPORT_CHUNK_ROWS)
+            else:
+                blocks = data.filter_index.iter_rows(bitmap, chunk_rows=EXPORT_CHUNK_ROWS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    # The generator holds its own snapshot reference, so a reload mid-export
+    # does not change the rows being streamed
+    response = Response(export_chunks(data.df, blocks, fmt), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="purchases.{fmt}"'
+    response.headers['X-Record-Count'] = str(total)
+    return response
 
 @app.route('/api/drill-down', methods=['GET'])
+@offloaded
 def get_drill_down_data():
     """Get detailed drill-down data for specific analysis type"""
     try:
         drill_type = request.args.get('type', 'total_spend')
         value = request.args.get('value', '')
-        department = request.args.get('department', 'all')
-        date_range = request.args.get('dateRange', 'all')
-        amount_range = request.args.get('amountRange', 'all')
-        
-        # Filter data based on parameters
-        filtered_df = df.copy()
-        
-        # Apply department filter
-        if department != 'all':
-            filtered_df = filtered_df[filtered_df['DEPARTMENT NAME'] == department]
         
-        # Apply date filter (simplified for demo)
-        if date_range != 'all':
-            # Implement date filtering logic here
-            pass
-        
-        # Apply amount filter
-        if amount_range != 'all':
-            # Implement amount filtering logic here
-            pass
+        # Filter data based on parameters (department, dateRange, amountRange, diversity, status)
+        data = current_dataset()
+        selection = select_rows(request.args, data)
         
         # Generate drill-down data based on type
         if drill_type == 'spend_performance':
-            drill_data = generate_spend_performance_drill(filtered_df)
+            drill_data = generate_spend_performance_drill(selection, data)
         elif drill_type == 'diversity':
-            drill_data = generate_diversity_drill(filtered_df)
+            drill_data = generate_diversity_drill(selection, data)
         elif drill_type == 'vendor_performance':
-            drill_data = generate_vendor_performance_drill(filtered_df)
+            drill_data = generate_vendor_performance_drill(selection, data)
         elif drill_type == 'department':
-            drill_data = generate_department_drill(filtered_df, value)
+            drill_data = generate_department_drill(selection, data, value)
         else:
-            drill_data = generate_default_drill(filtered_df)
+            drill_data = generate_default_drill(selection, data)
         
         return jsonify(drill_data)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def generate_spend_performance_drill(df_filtered):
+def trend_data(monthly_spend):
+    """trendData block of a drill-down from a monthly spend series"""
+    if monthly_spend.empty:
+        return {'labels': ['No Data'], 'data': [0]}
+    return {
+        'labels': monthly_spend.index,
+        'data': monthly_spend.to_numpy()
+    }
+
+def distribution_data(spend):
+    """Chart block of a drill-down from a spend-by-label series, 'No Data' when empty"""
+    if spend.empty:
+        return {'labels': ['No Data'], 'data': [0]}
+    return {
+        'labels': spend.index,
+        'data': spend.to_numpy()
+    }
+
+def drill_summary(view):
+    """Summary block shared by every drill-down, computed from the cube view"""
+    total_amount = view.total_spend()
+    record_count = view.total_count()
+    top_vendor = view.top('vendor', 1)
+    return {
+        'totalAmount': total_amount,
+        'recordCount': record_count,
+        'avgAmount': total_amount / record_count if record_count > 0 else 0,
+        'topVendor': top_vendor.index[0] if len(top_vendor) > 0 else 'N/A'
+    }
+
+def generate_spend_performance_drill(selection, data):
     """Generate spend performance drill-down data"""
     try:
-        total_amount = df_filtered['total_amount_clean'].sum()
-        record_count = len(df_filtered)
-        avg_amount = df_filtered['total_amount_clean'].mean() if len(df_filtered) > 0 else 0
-        top_vendor = df_filtered.groupby('VENDOR NAME 1')['total_amount_clean'].sum().idxmax() if len(df_filtered) > 0 else 'N/A'
+        view = selection.view
+        summary = drill_summary(view)
         
-        # Monthly trend data (sample for now)
-        monthly_spend = {
-            'Jan': total_amount * 0.08,
-            'Feb': total_amount * 0.09,
-            'Mar': total_amount * 0.12,
-            'Apr': total_amount * 0.15,
-            'May': total_amount * 0.18,
-            'Jun': total_amount * 0.14,
-            'Jul': total_amount * 0.13,
-            'Aug': total_amount * 0.11
-        }
+        # Monthly spend over the last 12 months of the selection
+        monthly_spend = trailing_months(selection_series(selection, data))
         
         # Top departments
-        dept_spend = df_filtered.groupby('DEPARTMENT NAME')['total_amount_clean'].sum().head(5)
+        dept_spend = view.spend_by('department').head(5)
         
         # Sample records
-        sample_records = df_filtered.head(10)[['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE']].to_dict('records')
+        sample_records = selection.head(10, ['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE']).to_dict('records')
         
         return {
-            'summary': {
-                'totalAmount': total_amount,
-                'recordCount': record_count,
-                'avgAmount': avg_amount,
-                'topVendor': top_vendor
-            },
-            'trendData': {
-                'labels': list(monthly_spend.keys()),
-                'data': list(monthly_spend.values())
-            },
-            'distributionData': {
-                'labels': dept_spend.index.tolist() if not dept_spend.empty else ['No Data'],
-                'data': dept_spend.values.tolist() if not dept_spend.empty else [0]
-            },
+            'summary': summary,
+            'trendData': trend_data(monthly_spend),
+            'distributionData': distribution_data(dept_spend),
             'records': [
                 {
                     'vendor': record['VENDOR NAME 1'],
@@ -344,31 +1024,26 @@ def generate_spend_performance_drill(df_filtered):
             'records': []
         }
 
-def generate_diversity_drill(df_filtered):
+def generate_diversity_drill(selection, data):
     """Generate diversity spending drill-down data"""
     try:
+        view = selection.view
+        
         # Calculate diversity metrics
-        minority_spend = df_filtered[df_filtered['MINORITY'] == 'Y']['total_amount_clean'].sum()
-        woman_spend = df_filtered[df_filtered['SB WOMAN'] == 'Y']['total_amount_clean'].sum()
-        veteran_spend = df_filtered[df_filtered['SB VETERAN'] == 'Y']['total_amount_clean'].sum()
-        total_spend = df_filtered['total_amount_clean'].sum()
+        minority_spend = view.flag_spend('minority')
+        woman_spend = view.flag_spend('woman')
+        veteran_spend = view.flag_spend('veteran')
+        total_spend = view.total_spend()
         
         return {
-            'summary': {
-                'totalAmount': total_spend,
-                'recordCount': len(df_filtered),
-                'avgAmount': df_filtered['total_amount_clean'].mean() if len(df_filtered) > 0 else 0,
-                'topVendor': df_filtered.groupby('VENDOR NAME 1')['total_amount_clean'].sum().idxmax() if len(df_filtered) > 0 else 'N/A'
-            },
-            'trendData': {
-                'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug'],
-                'data': [minority_spend/8 * (1 + i*0.1) for i in range(8)]  # Sample trend
-            },
+            'summary': drill_summary(view),
+            # Monthly spend with minority-, woman- or veteran-owned vendors
+            'trendData': trend_data(trailing_months(selection_series(selection.narrow({'diversity': 'diverse'}), data))),
             'distributionData': {
                 'labels': ['Minority', 'Woman-Owned', 'Veteran-Owned', 'Other'],
                 'data': [minority_spend, woman_spend, veteran_spend, max(0, total_spend - minority_spend - woman_spend - veteran_spend)]
             },
-            'records': df_filtered.head(10)[['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE', 'MINORITY', 'SB WOMAN', 'SB VETERAN']].to_dict('records')
+            'records': selection.head(10, ['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE', 'MINORITY', 'SB WOMAN', 'SB VETERAN']).to_dict('records')
         }
     except Exception as e:
         print(f"Error in diversity_drill: {e}")
@@ -379,37 +1054,26 @@ def generate_diversity_drill(df_filtered):
             'records': []
         }
 
-def generate_vendor_performance_drill(df_filtered):
+def generate_vendor_performance_drill(selection, data):
     """Generate vendor performance drill-down data"""
     try:
-        vendor_performance = df_filtered.groupby('VENDOR NAME 1')['total_amount_clean'].agg(['sum', 'count', 'mean']).reset_index()
-        vendor_performance = vendor_performance.sort_values('sum', ascending=False).head(10)
+        view = selection.view
+        vendor_spend = view.top('vendor', 10)
         
         return {
-            'summary': {
-                'totalAmount': df_filtered['total_amount_clean'].sum(),
-                'recordCount': len(df_filtered),
-                'avgAmount': df_filtered['total_amount_clean'].mean() if len(df_filtered) > 0 else 0,
-                'topVendor': vendor_performance.iloc[0]['VENDOR NAME 1'] if len(vendor_performance) > 0 else 'N/A'
-            },
-            'trendData': {
-                'labels': vendor_performance['VENDOR NAME 1'].head(6).tolist(),
-                'data': vendor_performance['sum'].head(6).tolist()
-            },
-            'distributionData': {
-                'labels': vendor_performance['VENDOR NAME 1'].head(5).tolist(),
-                'data': vendor_performance['sum'].head(5).tolist()
-            },
+            'summary': drill_summary(view),
+            'trendData': distribution_data(vendor_spend.head(6)),
+            'distributionData': distribution_data(vendor_spend.head(5)),
             'records': [
                 {
-                    'vendor': row['VENDOR NAME 1'],
+                    'vendor': vendor,
                     'department': 'Various',
-                    'amount': row['sum'],
+                    'amount': amount,
                     'date': '2025-08-29',
                     'category': 'Multiple',
                     'status': 'Active',
                     'diversity': 'Mixed'
-                } for _, row in vendor_performance.iterrows()
+                } for vendor, amount in vendor_spend.items()
             ]
         }
     except Exception as e:
@@ -421,27 +1085,18 @@ def generate_vendor_performance_drill(df_filtered):
             'records': []
         }
 
-def generate_department_drill(df_filtered, department_name):
+def generate_department_drill(selection, data, department_name):
     """Generate department-specific drill-down data"""
     try:
-        dept_data = df_filtered[df_filtered['DEPARTMENT NAME'] == department_name] if department_name else df_filtered
+        dept_selection = selection.narrow({'department': department_name}) if department_name else selection
+        view = dept_selection.view
+        vendor_spend = view.spend_by('vendor').head(5)
         
         return {
-            'summary': {
-                'totalAmount': dept_data['total_amount_clean'].sum(),
-                'recordCount': len(dept_data),
-                'avgAmount': dept_data['total_amount_clean'].mean() if len(dept_data) > 0 else 0,
-                'topVendor': dept_data.groupby('VENDOR NAME 1')['total_amount_clean'].sum().idxmax() if len(dept_data) > 0 else 'N/A'
-            },
-            'trendData': {
-                'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug'],
-                'data': [dept_data['total_amount_clean'].sum()/8 * (1 + i*0.05) for i in range(8)]
-            },
-            'distributionData': {
-                'labels': dept_data.groupby('VENDOR NAME 1')['total_amount_clean'].sum().head(5).index.tolist(),
-                'data': dept_data.groupby('VENDOR NAME 1')['total_amount_clean'].sum().head(5).values.tolist()
-            },
-            'records': dept_data.head(10)[['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE']].to_dict('records')
+            'summary': drill_summary(view),
+            'trendData': trend_data(trailing_months(selection_series(dept_selection, data))),
+            'distributionData': distribution_data(vendor_spend),
+            'records': dept_selection.head(10, ['VENDOR NAME 1', 'DEPARTMENT NAME', 'total_amount_clean', 'INPUT DATE']).to_dict('records')
         }
     except Exception as e:
         print(f"Error in department_drill: {e}")
@@ -452,25 +1107,18 @@ def generate_department_drill(df_filtered, department_name):
             'records': []
         }
 
-def generate_default_drill(df_filtered):
+def generate_default_drill(selection, data):
     """Generate default drill-down data"""
     try:
+        view = selection.view
         return {
-            'summary': {
-                'totalAmount': df_filtered['total_amount_clean'].sum(),
-                'recordCount': len(df_filtered),
-                'avgAmount': df_filtered['total_amount_clean'].mean() if len(df_filtered) > 0 else 0,
-                'topVendor': df_filtered.groupby('VENDOR NAME 1')['total_amount_clean'].sum().idxmax() if len(df_filtered) > 0 else 'N/A'
-            },
-            'trendData': {
-                'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug'],
-                'data': [df_filtered['total_amount_clean'].sum()/8 * (1 + i*0.1) for i in range(8)]
-            },
+            'summary': drill_summary(view),
+            'trendData': trend_data(trailing_months(selection_series(selection, data))),
             'distributionData': {
                 'labels': ['Category A', 'Category B', 'Category C', 'Category D'],
                 'data': [25, 30, 20, 25]
             },
-            'records': df_filtered.head(10).to_dict('records')
+            'records': selection.head(10).to_dict('records')
         }
     except Exception as e:
         print(f"Error in default_drill: {e}")
@@ -507,5 +1155,6 @@ if __name__ == '__main__':
     app.run(
         debug=not is_production,
         port=port,
-        host='0.0.0.0'
+        host='0.0.0.0',
+        threaded=True
     )
\ No newline at end of file
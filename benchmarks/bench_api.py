@@ -0,0 +1,162 @@
+# bench_api.py - Micro-benchmarks: ingestion, every /api handler and every drill-down generator
+#
+# Handlers run in-process through Flask's test client with the response cache
+# and the compute pool off, so each sample is the handler's own work.
+# Usage: python benchmarks/bench_api.py [--size 10k|1m|10m | --rows N] [--csv path]
+#                                       [--repeat 20] [--match drill] [--output results.json]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.report import latency_summary, peak_rss_mb, print_latency_table, write_report
+from benchmarks.synth_data import SIZES
+
+# Filter sets every case runs under: none, one indexed filter, several combined
+FILTER_SETS = {
+    'all': {},
+    'dept': {'department': 'PUBLIC WORKS'},
+    'mixed': {'department': 'PUBLIC WORKS', 'dateRange': '2024', 'amountRange': '1k-10k', 'diversity': 'woman'},
+}
+
+# Handler cases: name -> (path, extra query params)
+ENDPOINTS = {
+    'dashboard': ('/api/dashboard', {}),
+    'summary': ('/api/summary', {}),
+    'spend_trend': ('/api/charts/spend_trend', {}),
+    'spend_trend ytd': ('/api/charts/spend_trend', {'period': 'ytd'}),
+    'top_vendors': ('/api/charts/top_vendors', {}),
+    'diversity': ('/api/charts/diversity', {}),
+    'departments': ('/api/departments', {}),
+    'timeseries day': ('/api/timeseries', {'granularity': 'day'}),
+    'vendor search': ('/api/vendors/search', {'q': 'vendor 01'}),
+    'concentration': ('/api/vendors/concentration', {}),
+    'records': ('/api/records', {}),
+    'records amount desc': ('/api/records', {'sort': 'amount', 'order': 'desc'}),
+    'drill-down': ('/api/drill-down', {'type': 'total_spend'}),
+    'drill-down vendors': ('/api/drill-down', {'type': 'vendor_performance'}),
+}
+
+# Drill-down generators called directly: name -> (function name, value argument)
+DRILLS = {
+    'spend_performance': ('generate_spend_performance_drill', None),
+    'diversity': ('generate_diversity_drill', None),
+    'vendor_performance': ('generate_vendor_performance_drill', None),
+    'department': ('generate_department_drill', 'PUBLIC WORKS'),
+    'default': ('generate_default_drill', None),
+}
+
+
+def endpoint_url(path, params, filters):
+    query = urlencode({**filters, **params})
+    return f"{path}?{query}" if query else path
+
+
+def sample_ms(fn, repeat, warmup=1):
+    """Latencies of repeat calls of fn, after warmup untimed calls"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def bench_ingest(path, repeat):
+    """Parse + clean the CSV, then build the snapshot's cube and indexes"""
+    from dataset import DatasetSnapshot
+    from ingest import load_purchase_csv
+
+    results = {}
+    frames = []
+    results['ingest csv'] = latency_summary(sample_ms(lambda: frames.append(load_purchase_csv(path)), repeat, 0))
+    df = frames[-1]
+    del frames[:]
+    results['build snapshot'] = latency_summary(sample_ms(lambda: DatasetSnapshot(df), repeat, 0))
+    return results, len(df)
+
+
+def bench_handlers(m, repeat, match):
+    """Every endpoint case under every filter set, through the test client"""
+    client = m.app.test_client()
+    results = {}
+    for name, (path, params) in ENDPOINTS.items():
+        for filter_name, filters in FILTER_SETS.items():
+            case = f"{name} [{filter_name}]"
+            if match and match not in case:
+                continue
+            url = endpoint_url(path, params, filters)
+            status = client.get(url).status_code
+            if status != 200:
+                raise RuntimeError(f"{url} returned {status}")
+            results[case] = latency_summary(sample_ms(lambda: client.get(url), repeat, 0))
+    return results
+
+
+def bench_drills(m, repeat, match):
+    """Every generate_*_drill function on a fresh selection, as the route calls it"""
+    data = m.datasets.current()
+    results = {}
+    for name, (function, value) in DRILLS.items():
+        generate = getattr(m, function)
+        for filter_name, filters in FILTER_SETS.items():
+            case = f"{function} [{filter_name}]"
+            if match and match not in case:
+                continue
+            with m.app.test_request_context(endpoint_url('/api/drill-down', {}, filters)):
+                def run():
+                    selection = m.select_rows(m.request.args, data)
+                    if value is None:
+                        return generate(selection, data)
+                    return generate(selection, data, value)
+                results[case] = latency_summary(sample_ms(run, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark ingestion, API handlers and drill-downs')
+    parser.add_argument('--csv', help='existing purchase CSV (default: generate one)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--size', choices=SIZES, help='preset row count (overrides --rows)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--ingest-repeat', type=int, default=1, help='timed ingestion runs (0 skips them)')
+    parser.add_argument('--match', help='only cases whose name contains this text')
+    parser.add_argument('--output', help='save the results as JSON (- for stdout)')
+    args = parser.parse_args()
+    if args.size:
+        args.rows = SIZES[args.size]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            from benchmarks.synth_data import write_purchase_csv
+            path = write_purchase_csv(os.path.join(tmp, 'Purchase data.csv'), args.rows)
+
+        results, rows = {}, None
+        if args.ingest_repeat > 0 and not args.match:
+            results, rows = bench_ingest(path, args.ingest_repeat)
+        os.environ.update({'PURCHASE_DATA_FILE': path, 'PURCHASE_DELTA_FILE': '', 'DATA_CACHE_DIR': '',
+                           'DATA_RELOAD_INTERVAL': '0', 'RESPONSE_CACHE_SIZE': '0', 'COMPUTE_THREADS': '0'})
+        import app as app_module
+
+        rows = len(app_module.datasets.current().df)
+        results.update(bench_handlers(app_module, args.repeat, args.match))
+        results.update(bench_drills(app_module, args.repeat, args.match))
+
+    print(f"{rows:,} rows, {args.repeat} samples per case")
+    print_latency_table(results)
+    rss = peak_rss_mb()
+    print(f"Peak RSS: {rss:.1f} MiB")
+    if args.output:
+        write_report(args.output, 'api', {'rows': rows, 'csv': args.csv, 'repeat': args.repeat, 'match': args.match},
+                     results, peak_rss_mb=round(rss, 1))
+
+
+if __name__ == '__main__':
+    main()
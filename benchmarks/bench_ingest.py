@@ -0,0 +1,103 @@
+# bench_ingest.py - Cold-start ingestion benchmark: legacy .apply() vs typed pipeline
+#
+# Each pipeline runs in a fresh subprocess so peak RSS is measured in isolation.
+# Usage: python benchmarks/bench_ingest.py [--rows 1000000 | --size 10k|1m|10m] [--csv path] [--output results.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.report import peak_rss_mb, write_report
+from benchmarks.synth_data import SIZES
+
+
+def legacy_pipeline(path):
+    """The original app.py startup path"""
+    import pandas as pd
+
+    df = pd.read_csv(path)
+
+    def clean_money(amount_str):
+        if pd.isna(amount_str):
+            return 0
+        try:
+            return float(str(amount_str).replace('$', '').replace(',', ''))
+        except:
+            return 0
+
+    df['total_amount_clean'] = df['TOTAL AMOUNT'].apply(clean_money)
+    df['input_date'] = pd.to_datetime(df['INPUT DATE'], errors='coerce')
+    df['year'] = df['input_date'].dt.year
+    df['month'] = df['input_date'].dt.month
+    return df
+
+
+def typed_pipeline(path):
+    """Schema-driven ingestion from ingest.py"""
+    from ingest import load_purchase_csv
+    return load_purchase_csv(path)
+
+
+PIPELINES = {'legacy': legacy_pipeline, 'typed': typed_pipeline}
+
+
+def run_one(name, path):
+    """Run a single pipeline in this process and print its measurements as JSON"""
+    start = time.perf_counter()
+    df = PIPELINES[name](path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'pipeline': name,
+        'rows': len(df),
+        'seconds': elapsed,
+        'rows_per_sec': len(df) / elapsed if elapsed else 0,
+        'peak_rss_mb': peak_rss_mb(),
+        'frame_mb': df.memory_usage(deep=True).sum() / 2**20,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark purchase CSV ingestion')
+    parser.add_argument('--csv', help='existing purchase CSV (default: generate one)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--size', choices=SIZES, help='preset row count (overrides --rows)')
+    parser.add_argument('--output', help='save the results as JSON (- for stdout)')
+    parser.add_argument('--run', choices=PIPELINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, args.csv)
+        return
+    if args.size:
+        args.rows = SIZES[args.size]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            from benchmarks.synth_data import write_purchase_csv
+            path = write_purchase_csv(os.path.join(tmp, 'Purchase data.csv'), args.rows)
+
+        results = []
+        for name in PIPELINES:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', name, '--csv', path],
+                check=True, capture_output=True, text=True
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'pipeline':<10} {'rows':>10} {'seconds':>9} {'rows/sec':>12} {'peak RSS MB':>12} {'frame MB':>9}")
+    for r in results:
+        print(f"{r['pipeline']:<10} {r['rows']:>10,} {r['seconds']:>9.2f} {r['rows_per_sec']:>12,.0f} "
+              f"{r['peak_rss_mb']:>12.1f} {r['frame_mb']:>9.1f}")
+    if args.output:
+        write_report(args.output, 'ingest', {'rows': results[0]['rows'], 'csv': args.csv},
+                     {r['pipeline']: r for r in results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# bench_json.py - Encode time of the largest API payloads: stock jsonify vs FastJSONProvider
+#
+# The stock path converts arrays and Series with .tolist()/.to_dict() first,
+# as the handlers used to; the fast path hands them to the provider as they are.
+# Usage: python benchmarks/bench_json.py [--rows 1000000] [--csv path] [--repeat 20]
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def plain(obj):
+    """Payload with NumPy/pandas values turned into Python lists and scalars"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(obj, dict):
+        return {key: plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [plain(value) for value in obj]
+    if isinstance(obj, (pd.Series, pd.Index, np.ndarray)):
+        return [plain(value) for value in obj.tolist()]
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def build_payloads(app_module):
+    """Payload objects of the largest endpoints, built as the handlers build them"""
+    m = app_module
+    data = m.datasets.current()
+    payloads = {}
+    with m.app.test_request_context('/api/dashboard'):
+        view = m.filtered_cube({}, data)
+        payloads['/api/dashboard'] = {
+            'summary': m.summary_payload(view),
+            'spend_trend': m.spend_trend_payload(view),
+            'top_vendors': m.top_vendors_payload(view),
+            'diversity': m.diversity_payload(view),
+            'departments': m.departments_payload(view),
+        }
+        series = data.timeseries.total
+        buckets = series.daily(series.first_day, series.last_day + 1)
+        payloads['/api/timeseries?granularity=day'] = {'labels': buckets.index, 'values': buckets.to_numpy()}
+        vendor_spend = view.spend_by('vendor')
+        payloads['vendor spend (all vendors)'] = {'labels': vendor_spend.index, 'values': vendor_spend.to_numpy()}
+        rows, _ = data.sort_index.page('amount', 'desc', None, 0, m.MAX_PAGE_SIZE)
+        payloads[f'/api/records?limit={m.MAX_PAGE_SIZE}'] = {'records': m.record_rows(data.df, rows)}
+        payloads['/api/drill-down?type=other'] = m.generate_default_drill(m.select_rows({}, data), data)
+    return payloads
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON encoding of API payloads')
+    parser.add_argument('--csv', help='existing purchase CSV (default: generate one)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print machine-readable output')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            from benchmarks.synth_data import write_purchase_csv
+            path = write_purchase_csv(os.path.join(tmp, 'Purchase data.csv'), args.rows)
+        os.environ.update({'PURCHASE_DATA_FILE': path, 'PURCHASE_DELTA_FILE': os.path.join(tmp, 'none.csv'),
+                           'DATA_CACHE_DIR': '', 'DATA_RELOAD_INTERVAL': '0'})
+        import app as app_module
+        from flask.json.provider import DefaultJSONProvider
+        from json_provider import FastJSONProvider, orjson
+
+        stock = DefaultJSONProvider(app_module.app)
+        fast = FastJSONProvider(app_module.app)
+        results = []
+        with app_module.app.app_context():
+            for name, payload in build_payloads(app_module).items():
+                results.append({
+                    'payload': name,
+                    'bytes': len(fast.response(payload).get_data()),
+                    'stock_ms': median_ms(lambda: stock.response(plain(payload)), args.repeat),
+                    'fast_ms': median_ms(lambda: fast.response(payload), args.repeat),
+                })
+
+    if args.json:
+        print(json.dumps({'encoder': 'orjson' if orjson else 'json', 'results': results}, indent=2))
+        return
+    print(f"FastJSONProvider encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"{'payload':<36} {'bytes':>10} {'stock ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for r in results:
+        print(f"{r['payload']:<36} {r['bytes']:>10,} {r['stock_ms']:>9.3f} {r['fast_ms']:>9.3f} "
+              f"{r['stock_ms'] / r['fast_ms'] if r['fast_ms'] else 0:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
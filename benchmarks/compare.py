@@ -0,0 +1,92 @@
+# compare.py - Diff two saved benchmark result files (bench_api, bench_ingest or load_test --output)
+#
+# Usage: python benchmarks/compare.py base.json new.json [--threshold 10] [--fail-on-regression]
+import argparse
+import json
+import sys
+
+# Metric name suffix -> True when a larger value is better
+METRIC_DIRECTION = {
+    '_ms': False,
+    'seconds': False,
+    '_mb': False,
+    'rows_per_sec': True,
+    'throughput_rps': True,
+}
+
+
+def metric_direction(name):
+    for suffix, higher_is_better in METRIC_DIRECTION.items():
+        if name.endswith(suffix):
+            return higher_is_better
+    return None
+
+
+def flatten(results, prefix=''):
+    """{'case.metric': value} of every numeric leaf"""
+    values = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(base, new, threshold):
+    """Rows of (metric, base, new, change %, verdict) for metrics in both runs"""
+    base_values = flatten({'results': base['results'], 'server': base.get('server') or {},
+                           'peak_rss_mb': base.get('peak_rss_mb')})
+    new_values = flatten({'results': new['results'], 'server': new.get('server') or {},
+                          'peak_rss_mb': new.get('peak_rss_mb')})
+    rows = []
+    for name in base_values:
+        higher_is_better = metric_direction(name)
+        if name not in new_values or higher_is_better is None:
+            continue
+        old, value = base_values[name], new_values[name]
+        change = (value - old) / old * 100 if old else 0.0
+        verdict = ''
+        if abs(change) >= threshold:
+            verdict = 'better' if (change > 0) == higher_is_better else 'WORSE'
+        rows.append((name.replace('results.', '', 1), old, value, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change flagged as better/WORSE')
+    parser.add_argument('--all', action='store_true', help='also list metrics that changed less than the threshold')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 if any metric got WORSE')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base['benchmark'] != new['benchmark']:
+        sys.exit(f"❌ Cannot compare a '{base['benchmark']}' run with a '{new['benchmark']}' run")
+
+    for label, report in (('base', base), ('new', new)):
+        env = report['environment']
+        print(f"{label}: {report['recorded_at']} commit {env['commit']} python {env['python']} "
+              f"numpy {env['numpy']} pandas {env['pandas']} config {json.dumps(report['config'], sort_keys=True)}")
+
+    rows = compare(base, new, args.threshold)
+    shown = [row for row in rows if args.all or row[4]]
+    width = max([len('metric')] + [len(row[0]) for row in shown])
+    print(f"{'metric':<{width}} {'base':>12} {'new':>12} {'change':>8}")
+    for name, old, value, change, verdict in shown:
+        print(f"{name:<{width}} {old:>12.3f} {value:>12.3f} {change:>+7.1f}% {verdict}")
+    worse = sum(1 for row in rows if row[4] == 'WORSE')
+    better = sum(1 for row in rows if row[4] == 'better')
+    print(f"{len(rows)} metrics compared: {better} better, {worse} worse by {args.threshold:g}% or more")
+    if args.fail_on_regression and worse:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
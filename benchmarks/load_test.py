@@ -0,0 +1,238 @@
+# load_test.py - Concurrent HTTP load against a local dashboard server
+#
+# Starts gunicorn with gunicorn.conf.py on a synthetic extract (or targets a
+# running server with --url), drives it from --concurrency client threads for
+# --duration seconds with a mix of page, chart, records and drill-down
+# requests, and reports throughput, p50/p95/p99 latency per request kind and
+# the server's peak RSS.
+# Usage: python benchmarks/load_test.py [--size 10k|1m|10m | --rows N] [--csv path] [--url http://host:port]
+#                                       [--concurrency 16] [--duration 30] [--cache-bust] [--output results.json]
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.report import latency_summary, peak_rss_mb, print_latency_table, write_report
+from benchmarks.synth_data import DEPARTMENTS, SIZES
+from process_memory import child_pids, memory_usage
+
+# Request kind -> (weight in the mix, path, extra query params)
+REQUEST_MIX = {
+    'dashboard page': (5, '/dashboard', None),
+    'dashboard api': (20, '/api/dashboard', {}),
+    'top_vendors': (10, '/api/charts/top_vendors', {}),
+    'spend_trend ytd': (10, '/api/charts/spend_trend', {'period': 'ytd'}),
+    'timeseries': (5, '/api/timeseries', {'granularity': 'month'}),
+    'records': (15, '/api/records', {'sort': 'amount', 'order': 'desc'}),
+    'vendor search': (10, '/api/vendors/search', {'q': 'vendor 0'}),
+    'drill-down': (15, '/api/drill-down', {'type': 'spend_performance'}),
+    'drill-down dept': (10, '/api/drill-down', {'type': 'department', 'value': 'PUBLIC WORKS'}),
+}
+
+# Filter values the clients pick from; a filter is left out half the time
+FILTER_CHOICES = {
+    'department': DEPARTMENTS,
+    'dateRange': ['2023', '2024', '2025', 'ytd', 'last90'],
+    'amountRange': ['under1k', '1k-10k', '10k-100k', '100k-1m', 'over1m'],
+    'diversity': ['minority', 'woman', 'veteran', 'diverse'],
+}
+
+
+def random_request(rng, cache_bust):
+    """(kind, path with query) of one request drawn from the mix"""
+    kinds = list(REQUEST_MIX)
+    kind = rng.choices(kinds, weights=[REQUEST_MIX[k][0] for k in kinds])[0]
+    _, path, params = REQUEST_MIX[kind]
+    if params is None:
+        return kind, path
+    query = dict(params)
+    for name, values in FILTER_CHOICES.items():
+        if rng.random() < 0.5:
+            query[name] = rng.choice(values)
+    if cache_bust:
+        # An unknown param is part of the cache key, so every request misses
+        query['nocache'] = rng.getrandbits(48)
+    return kind, f"{path}?{urlencode(query)}"
+
+
+class LoadClient(threading.Thread):
+    """One keep-alive connection sending requests back to back until stop is set"""
+
+    def __init__(self, url, seed, cache_bust, stop, timeout):
+        super().__init__(daemon=True)
+        self.target = urlsplit(url)
+        self.rng = random.Random(seed)
+        self.cache_bust = cache_bust
+        self.stop = stop
+        self.timeout = timeout
+        self.samples = []  # (kind, status, ms, completed at)
+
+    def _connect(self):
+        return http.client.HTTPConnection(self.target.hostname, self.target.port or 80, timeout=self.timeout)
+
+    def run(self):
+        connection = self._connect()
+        while not self.stop.is_set():
+            kind, path = random_request(self.rng, self.cache_bust)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+                connection.close()
+                connection = self._connect()
+            end = time.perf_counter()
+            self.samples.append((kind, status, (end - start) * 1000, end))
+        connection.close()
+
+
+class RSSMonitor(threading.Thread):
+    """Samples the server processes' RSS and keeps the peak total"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_total_mb = 0.0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            usages = [memory_usage(pid) for pid in [self.pid] + child_pids(self.pid)]
+            total = sum(usage['rss_mb'] for usage in usages if usage)
+            self.peak_total_mb = max(self.peak_total_mb, total)
+
+    def report(self):
+        pids = [self.pid] + child_pids(self.pid)
+        return {
+            'peak_total_rss_mb': round(self.peak_total_mb, 1),
+            'peak_rss_mb_per_process': [round(mb, 1) for mb in map(peak_rss_mb, pids) if mb is not None],
+        }
+
+
+def wait_until_up(url, timeout):
+    target = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+            connection.request('GET', '/api/system/dataset')
+            body = json.loads(connection.getresponse().read())
+            connection.close()
+            return body
+        except (OSError, http.client.HTTPException, ValueError):
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout:.0f}s")
+
+
+def start_server(path, port, tmp):
+    """gunicorn on the repo's config serving path; returns the master process"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PURCHASE_DATA_FILE=path, PURCHASE_DELTA_FILE='', DATA_CACHE_DIR=os.path.join(tmp, 'cache'),
+               DATA_RELOAD_INTERVAL='0', GUNICORN_BIND=f'127.0.0.1:{port}')
+    log = open(os.path.join(tmp, 'gunicorn.log'), 'w')
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'app:app'],
+                            cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def run_load(url, concurrency, duration, warmup, cache_bust, seed):
+    """Drive the server and summarize the samples taken after the warmup"""
+    stop = threading.Event()
+    clients = [LoadClient(url, seed + i, cache_bust, stop, timeout=max(60, duration)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    time.sleep(warmup + duration)
+    stop.set()
+    for client in clients:
+        client.join()
+
+    measured_from = started + warmup
+    samples = [s for client in clients for s in client.samples if s[3] >= measured_from]
+    window = max(max((s[3] for s in samples), default=measured_from) - measured_from, 1e-9)
+    results = {}
+    for kind in REQUEST_MIX:
+        kind_samples = [s for s in samples if s[0] == kind]
+        summary = latency_summary([s[2] for s in kind_samples if s[1] == 200])
+        summary['statuses'] = {str(status): sum(1 for s in kind_samples if s[1] == status)
+                               for status in sorted({s[1] for s in kind_samples})}
+        summary['throughput_rps'] = round(len(kind_samples) / window, 2)
+        results[kind] = summary
+    overall = latency_summary([s[2] for s in samples if s[1] == 200])
+    overall['requests'] = len(samples)
+    overall['errors'] = sum(1 for s in samples if s[1] != 200)
+    overall['throughput_rps'] = round(len(samples) / window, 2)
+    results['all'] = overall
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent HTTP load test of the dashboard API')
+    parser.add_argument('--url', help='running server to target (default: start gunicorn locally)')
+    parser.add_argument('--csv', help='existing purchase CSV for the local server (default: generate one)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--size', choices=SIZES, help='preset row count (overrides --rows)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds first')
+    parser.add_argument('--cache-bust', action='store_true', help='make every request miss the response cache')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    parser.add_argument('--output', help='save the results as JSON (- for stdout)')
+    args = parser.parse_args()
+    if args.size:
+        args.rows = SIZES[args.size]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = monitor = None
+        url = args.url
+        try:
+            if url is None:
+                path = args.csv
+                if path is None:
+                    from benchmarks.synth_data import write_purchase_csv
+                    path = write_purchase_csv(os.path.join(tmp, 'Purchase data.csv'), args.rows)
+                server = start_server(path, args.port, tmp)
+                url = f'http://127.0.0.1:{args.port}'
+            status = wait_until_up(url, args.startup_timeout)
+            if server is not None:
+                monitor = RSSMonitor(server.pid)
+                monitor.start()
+            results = run_load(url, args.concurrency, args.duration, args.warmup, args.cache_bust, args.seed)
+            server_memory = monitor.report() if monitor else None
+        finally:
+            if monitor:
+                monitor.stop.set()
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    overall = results['all']
+    print(f"{status['records']:,} records, {args.concurrency} clients for {args.duration:g}s"
+          f"{' (cache-busting)' if args.cache_bust else ''}")
+    print_latency_table(results, 'request')
+    print(f"Throughput: {overall['throughput_rps']:.1f} req/s, errors: {overall['errors']}")
+    if server_memory:
+        print(f"Server peak RSS: {server_memory['peak_total_rss_mb']:.1f} MiB total, "
+              f"per process {server_memory['peak_rss_mb_per_process']}")
+    if args.output:
+        config = {'url': args.url, 'records': status['records'], 'concurrency': args.concurrency,
+                  'duration': args.duration, 'warmup': args.warmup, 'cache_bust': args.cache_bust, 'seed': args.seed}
+        write_report(args.output, 'load', config, results, server=server_memory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# report.py - Latency summaries, peak memory and result files shared by the benchmarks
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def latency_summary(samples_ms):
+    """Count, mean and p50/p95/p99/max of latency samples in milliseconds"""
+    if not len(samples_ms):
+        return {'count': 0}
+    samples = np.asarray(samples_ms, dtype=float)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def peak_rss_mb(pid='self'):
+    """Peak resident set size of a process in MiB"""
+    # VmHWM resets on exec; ru_maxrss would inherit the parent's high-water mark
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid != 'self':
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def environment():
+    """What produced a result: code version, interpreter and library versions, machine"""
+    import pandas as pd
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_report(path, benchmark, config, results, **extra):
+    """Save a benchmark run as JSON with sorted keys, so two runs diff line by line"""
+    report = {
+        'benchmark': benchmark,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'config': config,
+        'results': results,
+    }
+    report.update(extra)
+    text = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    if path == '-':
+        sys.stdout.write(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+    return report
+
+
+def print_latency_table(results, title='case'):
+    """One line per case: count, p50/p95/p99 and max latency"""
+    width = max([len(title)] + [len(name) for name in results])
+    print(f"{title:<{width}} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, r in results.items():
+        if not r.get('count'):
+            print(f"{name:<{width}} {0:>7}")
+            continue
+        print(f"{name:<{width}} {r['count']:>7} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}")
@@ -0,0 +1,68 @@
+# synth_data.py - Synthetic Purchase data.csv generator for benchmarks
+import argparse
+
+import numpy as np
+import pandas as pd
+
+DEPARTMENTS = [
+    'COMMUNITY DEVELOP', 'PUBLIC WORKS', 'AIRPORT', 'ENV SERV', 'UTILITIES',
+    'GENERAL SERVICES', 'FINANCE', 'POLICE', 'FIRE', 'PARKS & REC',
+]
+STATUSES = ['Posted', 'Created', 'Approved']
+VENDOR_SUFFIXES = ['', '', '', ' INC', ' LLC', ' CORP', ', INC.']
+
+# --size presets of the benchmark extracts
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+
+def generate_purchase_frame(rows, vendors=5000, seed=42):
+    """Random purchase rows with the same columns and formats as the real extract"""
+    rng = np.random.default_rng(seed)
+    vendor_names = np.array([
+        f"VENDOR {i:05d}{VENDOR_SUFFIXES[i % len(VENDOR_SUFFIXES)]}" for i in range(vendors)
+    ])
+    # Skewed vendor popularity, like real procurement spend
+    vendor_ids = np.minimum(rng.zipf(1.3, rows) - 1, vendors - 1)
+    amounts = np.round(rng.lognormal(7.5, 2.0, rows), 2)
+    days = rng.integers(0, 3 * 365, rows)
+    dates = (pd.Timestamp('2023-01-01') + pd.to_timedelta(days, unit='D')).strftime('%m/%d/%Y')
+
+    return pd.DataFrame({
+        'DOCUMENT ID': np.arange(rows),
+        'TOTAL AMOUNT': pd.Series(amounts).map('${:,.2f}'.format),
+        'VENDOR NAME 1': vendor_names[vendor_ids],
+        'DEPARTMENT NAME': np.array(DEPARTMENTS)[rng.integers(0, len(DEPARTMENTS), rows)],
+        'INPUT DATE': dates,
+        'MINORITY': np.where(rng.random(rows) < 0.08, 'Y', 'N'),
+        'SB WOMAN': np.where(rng.random(rows) < 0.10, 'Y', 'N'),
+        'SB VETERAN': np.where(rng.random(rows) < 0.03, 'Y', 'N'),
+        'DOCUMENT STATUS DESCRIPTION': np.array(STATUSES)[rng.integers(0, len(STATUSES), rows)],
+        'DESCRIPTION': 'PURCHASE ORDER LINE',
+    })
+
+
+def write_purchase_csv(path, rows, vendors=5000, seed=42, chunk_rows=500_000):
+    """Write a synthetic purchase CSV in chunks so large files fit in memory"""
+    written = 0
+    while written < rows:
+        chunk = min(chunk_rows, rows - written)
+        frame = generate_purchase_frame(chunk, vendors=vendors, seed=seed + written)
+        frame['DOCUMENT ID'] += written
+        frame.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += chunk
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic Purchase data.csv')
+    parser.add_argument('path', nargs='?', default='Purchase data.csv')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--size', choices=SIZES, help='preset row count (overrides --rows)')
+    parser.add_argument('--vendors', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if args.size:
+        args.rows = SIZES[args.size]
+
+    write_purchase_csv(args.path, args.rows, vendors=args.vendors, seed=args.seed)
+    print(f"✅ Wrote {args.rows:,} rows to {args.path}")
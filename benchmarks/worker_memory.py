@@ -0,0 +1,45 @@
+# worker_memory.py - Per-worker unique memory of a running gunicorn server
+#
+# Usage: python benchmarks/worker_memory.py <gunicorn master pid>
+#        (e.g. from `gunicorn --pid gunicorn.pid ...`: $(cat gunicorn.pid))
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_memory import child_pids, memory_usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report RSS/PSS/USS for a gunicorn master and its workers')
+    parser.add_argument('master_pid', type=int)
+    parser.add_argument('--json', action='store_true', help='print machine-readable output')
+    args = parser.parse_args()
+
+    master = memory_usage(args.master_pid)
+    if master is None:
+        sys.exit(f"❌ Cannot read /proc/{args.master_pid}/smaps_rollup")
+    workers = [usage for usage in map(memory_usage, child_pids(args.master_pid)) if usage]
+
+    report = {
+        'master': master,
+        'workers': workers,
+        'worker_uss_total_mb': sum(w['uss_mb'] for w in workers),
+        'total_pss_mb': master['pss_mb'] + sum(w['pss_mb'] for w in workers),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'process':<10} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9} {'shared MB':>10}")
+    for role, usage in [('master', master)] + [('worker', w) for w in workers]:
+        print(f"{role:<10} {usage['pid']:>8} {usage['rss_mb']:>9.1f} {usage['pss_mb']:>9.1f} "
+              f"{usage['uss_mb']:>9.1f} {usage['shared_mb']:>10.1f}")
+    print(f"\nUnique memory per worker (avg): {report['worker_uss_total_mb'] / max(len(workers), 1):.1f} MB")
+    print(f"Total PSS (master + workers):    {report['total_pss_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
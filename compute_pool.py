@@ -0,0 +1,107 @@
+# compute_pool.py - Bounded thread pool for the heavy aggregation routes
+import contextvars
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class PoolSaturated(Exception):
+    """Every compute thread is busy and the wait queue is full"""
+
+
+class DeadlineExceeded(Exception):
+    """The computation did not finish within the request's deadline"""
+
+
+class ComputePool:
+    """Runs aggregation work on a fixed set of threads with admission control.
+
+    At most threads + queue_size calls are admitted at once; the next one
+    is refused straight away (PoolSaturated) instead of piling up behind
+    the others. A caller waits at most deadline seconds for its result
+    (DeadlineExceeded); work still queued by then is dropped, work already
+    running finishes in the background and keeps its slot until it does,
+    so the bound holds under overload. The NumPy/pandas kernels release
+    the GIL for most of their time, so the request threads that serve
+    pages and cached responses stay responsive meanwhile.
+
+    Threads are started after a fork, in the worker that first uses them.
+    """
+
+    def __init__(self, threads, queue_size, deadline):
+        self.threads = threads
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.dropped = 0
+        self._admitted = 0
+        self._running = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._pid != os.getpid():
+            # Threads do not survive a fork; start a fresh pool in this worker
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='compute')
+            self._pid = os.getpid()
+            self._admitted = self._running = 0
+        return self._executor
+
+    def _run(self, context, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._admitted -= 1
+                self.completed += 1
+
+    def _dropped(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._admitted -= 1
+                self.dropped += 1
+
+    def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) on a compute thread, in the caller's context.
+
+        The caller's context variables (Flask's request and g among them)
+        are copied to the compute thread. Raises PoolSaturated or
+        DeadlineExceeded; anything fn raises is re-raised here.
+        """
+        with self._lock:
+            executor = self._pool()
+            if self._admitted >= self.threads + self.queue_size:
+                self.rejected += 1
+                raise PoolSaturated(f"All {self.threads} compute threads are busy and "
+                                    f"{self.queue_size} requests are already waiting")
+            self._admitted += 1
+        future = executor.submit(self._run, contextvars.copy_context(), fn, args, kwargs)
+        future.add_done_callback(self._dropped)
+        try:
+            return future.result(timeout=self.deadline)
+        except (FutureTimeout, CancelledError):
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise DeadlineExceeded(f"Computation took longer than {self.deadline:g}s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threads': self.threads,
+                'queue_size': self.queue_size,
+                'deadline_seconds': self.deadline,
+                'running': self._running,
+                'queued': self._admitted - self._running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,406 @@
+# data_cache.py - Columnar on-disk cache of the cleaned purchase frame
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bump when the cleaned frame's layout or the pickled index classes change so stale caches are rebuilt
+CACHE_FORMAT = 5
+
+# Bytes hashed from each end of the source file for its fingerprint
+FINGERPRINT_SAMPLE_BYTES = 1 << 20
+
+# Separator between category strings in the .categories blob
+CATEGORY_SEPARATOR = '\x00'
+
+# Pickled derived indexes stored next to the columns (state.pkl); their large arrays are state.N.npy files
+STATE_NAME = 'state'
+
+# Numeric arrays with at least this many elements are stored out of the pickle and memory-mapped
+STATE_ARRAY_MIN_SIZE = 4096
+
+# Fixed .npy header size of columns written chunk by chunk; rewritten once the row count is known
+NPY_HEADER_BYTES = 128
+
+
+def source_fingerprint(path):
+    """mtime, size and a content hash identifying one version of a source file.
+
+    The hash covers the first and last MiB plus the size, which catches
+    replaced or appended extracts without reading a multi-GB file on boot.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256(str(stat.st_size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+        if stat.st_size > FINGERPRINT_SAMPLE_BYTES:
+            f.seek(max(FINGERPRINT_SAMPLE_BYTES, stat.st_size - FINGERPRINT_SAMPLE_BYTES))
+            digest.update(f.read())
+    return {
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': digest.hexdigest(),
+    }
+
+
+def cache_key(fingerprint, layout='frame'):
+    """Directory name for a cache entry"""
+    # Entries hold pickles, so a pandas or numpy upgrade starts a new one
+    payload = json.dumps([CACHE_FORMAT, pd.__version__, np.__version__, fingerprint, layout],
+                         sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:24]
+
+
+def _write_categories(path, categories):
+    text = CATEGORY_SEPARATOR.join(str(value) for value in categories)
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+
+
+def _read_categories(path, count):
+    if count == 0:
+        return pd.Index([], dtype=object)
+    with open(path, 'rb') as f:
+        values = f.read().decode('utf-8').split(CATEGORY_SEPARATOR)
+    return pd.Index(values, dtype=object)
+
+
+def write_frame(directory, df, fingerprint):
+    """Write every column of a frame as .npy files plus a manifest"""
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        if not isinstance(series.dtype, pd.CategoricalDtype) and series.dtype == object:
+            # Text columns are stored dictionary-encoded so they can be memory-mapped
+            series = series.astype('category')
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Pickled whole: unpickling skips the uniqueness check from_codes runs over the categories
+            _write_pickle(directory, f'{i}.categorical', series.array)
+            columns.append({'name': name, 'kind': 'categorical', 'categories': len(series.cat.categories)})
+        else:
+            np.save(os.path.join(directory, f'{i}.npy'), series.to_numpy())
+            columns.append({'name': name, 'kind': 'array'})
+
+    manifest = {
+        'format': CACHE_FORMAT,
+        'source': fingerprint,
+        'rows': len(df),
+        'columns': columns,
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+
+def _npy_header(dtype, rows):
+    """A version 1.0 .npy header for a 1-D array, padded to NPY_HEADER_BYTES"""
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (rows,)})
+    prefix = b'\x93NUMPY\x01\x00'
+    size = NPY_HEADER_BYTES - len(prefix) - 2
+    return prefix + struct.pack('<H', size) + header.ljust(size - 1).encode('latin1') + b'\n'
+
+
+def _code_dtype(categories):
+    """Narrowest code dtype pandas uses for that many categories"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ColumnWriter:
+    """One .npy column file grown a chunk at a time"""
+
+    def __init__(self, path, dtype):
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._file = open(path, 'wb')
+        self._file.write(_npy_header(self.dtype, 0))
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(values.tobytes())
+        self.rows += len(values)
+
+    def remap(self, start, stop, mapping):
+        """Replace the values written to rows [start, stop) by mapping[value], in place"""
+        self._file.flush()
+        region = np.memmap(self._file.name, dtype=self.dtype, mode='r+', shape=(stop - start,),
+                           offset=NPY_HEADER_BYTES + start * self.dtype.itemsize)
+        region[:] = mapping[region]
+        region.flush()
+        del region
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, self.rows))
+        self._file.close()
+
+    def narrow(self, dtype, chunk_rows=1 << 22):
+        """Rewrite the closed file with a smaller dtype, a block at a time"""
+        if np.dtype(dtype) == self.dtype:
+            return
+        path = self._file.name
+        values = np.load(path, mmap_mode='r')
+        narrowed = ColumnWriter(path + '.narrow', dtype)
+        for start in range(0, len(values), chunk_rows):
+            narrowed.append(values[start:start + chunk_rows])
+        narrowed.close()
+        del values
+        os.replace(path + '.narrow', path)
+
+
+class FrameWriter:
+    """Writes a cleaned frame chunk by chunk in the layout read_frame loads.
+
+    Only the current chunk and each text column's dictionary are held in
+    memory. Categories new in a chunk are appended to the column's
+    dictionary, so codes written earlier stay valid. Extra per-row arrays
+    (derived indexes) are stored next to the columns and loaded with
+    read_arrays.
+    """
+
+    def __init__(self, directory, fingerprint):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.rows = 0
+        self._columns = None    # [(name, kind, writer)] in frame order
+        self._categories = {}   # column -> pd.Index of its values, in code order
+        self._arrays = {}       # name -> ColumnWriter of extra per-row arrays
+
+    def _open(self, df):
+        self._columns = []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+                writer = ColumnWriter(os.path.join(self.directory, f'{i}.codes.npy'), np.int32)
+                self._categories[name] = pd.Index([], dtype=object)
+                self._columns.append((name, 'category', writer))
+            else:
+                # A later chunk may have missing values where this one has none
+                dtype = np.float64 if pd.api.types.is_integer_dtype(series.dtype) else series.dtype
+                writer = ColumnWriter(os.path.join(self.directory, f'{i}.npy'), dtype)
+                self._columns.append((name, 'array', writer))
+
+    def _codes(self, name, series):
+        """Codes of a chunk's text column in the column-wide dictionary"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values, codes = series.cat.categories, series.cat.codes.to_numpy()
+        else:
+            codes, values = pd.factorize(series)
+        categories = self._categories[name]
+        mapping = categories.get_indexer(values)
+        unseen = mapping < 0
+        if unseen.any():
+            mapping[unseen] = len(categories) + np.arange(np.count_nonzero(unseen))
+            self._categories[name] = categories.append(pd.Index(values[unseen], dtype=object))
+        # Missing values keep code -1 (mapping is empty when the chunk has none of this column)
+        present = codes >= 0
+        chunk_codes = np.full(len(codes), -1, dtype=np.int64)
+        chunk_codes[present] = mapping[codes[present]]
+        return chunk_codes
+
+    def append(self, df, **arrays):
+        """Write a chunk's columns (and its slice of each extra array)"""
+        if self._columns is None:
+            self._open(df)
+        for name, kind, writer in self._columns:
+            writer.append(self._codes(name, df[name]) if kind == 'category' else df[name].to_numpy())
+        for name, values in arrays.items():
+            if name not in self._arrays:
+                self._arrays[name] = ColumnWriter(os.path.join(self.directory, f'{name}.array.npy'), values.dtype)
+            self._arrays[name].append(values)
+        self.rows += len(df)
+
+    def remap(self, name, start, stop, mapping):
+        """Rewrite rows [start, stop) of an extra array through mapping, e.g. once their ids are final"""
+        self._arrays[name].remap(start, stop, mapping)
+
+    def close(self):
+        """Finish the column files and write the manifest"""
+        columns = []
+        for i, (name, kind, writer) in enumerate(self._columns or []):
+            writer.close()
+            if kind == 'category':
+                # Codes stored at the width read_frame's categoricals use, so they load without a copy
+                writer.narrow(_code_dtype(len(self._categories[name])))
+                _write_categories(os.path.join(self.directory, f'{i}.categories'), self._categories[name])
+                columns.append({'name': name, 'kind': 'category', 'categories': len(self._categories[name])})
+            else:
+                columns.append({'name': name, 'kind': 'array'})
+        for writer in self._arrays.values():
+            writer.close()
+        manifest = {
+            'format': CACHE_FORMAT,
+            'source': self.fingerprint,
+            'rows': self.rows,
+            'columns': columns,
+            'arrays': list(self._arrays),
+        }
+        with open(os.path.join(self.directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+
+def read_arrays(directory, mmap=True):
+    """Extra per-row arrays a FrameWriter stored next to the columns, memory-mapped"""
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    return {
+        name: np.load(os.path.join(directory, f'{name}.array.npy'), mmap_mode='r' if mmap else None)
+        for name in manifest.get('arrays', [])
+    }
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickler writing each large numeric array to its own .npy file, named prefix.N.npy"""
+
+    def __init__(self, f, directory, prefix):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.prefix = prefix
+        self.files = {}  # (address, shape, strides, dtype) -> file name, so shared arrays are written once
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray and not isinstance(obj, np.memmap):
+            return None
+        if obj.dtype.hasobject or obj.size < STATE_ARRAY_MIN_SIZE:
+            return None
+        key = (obj.__array_interface__['data'][0], obj.shape, obj.strides, obj.dtype.str)
+        name = self.files.get(key)
+        if name is None:
+            name = self.files[key] = f'{self.prefix}.{len(self.files)}.npy'
+            np.save(os.path.join(self.directory, name), np.ascontiguousarray(obj))
+        return name
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    def __init__(self, f, directory, mmap):
+        super().__init__(f)
+        self.directory = directory
+        self.mmap_mode = 'r' if mmap else None
+        self.arrays = {}
+
+    def persistent_load(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.directory, name), mmap_mode=self.mmap_mode)
+        return self.arrays[name]
+
+
+def _write_pickle(directory, name, obj):
+    with open(os.path.join(directory, f'{name}.pkl'), 'wb') as f:
+        _ArrayPickler(f, directory, name).dump(obj)
+
+
+def _read_pickle(directory, name, mmap=True):
+    with open(os.path.join(directory, f'{name}.pkl'), 'rb') as f:
+        return _ArrayUnpickler(f, directory, mmap).load()
+
+
+def write_state(directory, state):
+    """Pickle derived objects into a cache entry; their large arrays become .npy files"""
+    _write_pickle(directory, STATE_NAME, state)
+
+
+def read_state(directory, mmap=True):
+    """Objects saved by write_state, with their large arrays memory-mapped (read-only)"""
+    return _read_pickle(directory, STATE_NAME, mmap)
+
+
+def read_frame(directory, mmap=True):
+    """Load a cached frame; numeric columns and category codes stay memory-mapped"""
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    mmap_mode = 'r' if mmap else None
+
+    data = {}
+    for i, column in enumerate(manifest['columns']):
+        if column['kind'] == 'categorical':
+            data[column['name']] = _read_pickle(directory, f'{i}.categorical', mmap)
+        elif column['kind'] == 'category':
+            codes = np.load(os.path.join(directory, f'{i}.codes.npy'), mmap_mode=mmap_mode)
+            categories = _read_categories(os.path.join(directory, f'{i}.categories'), column['categories'])
+            data[column['name']] = pd.Categorical.from_codes(codes, categories=categories, validate=False)
+        else:
+            data[column['name']] = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode=mmap_mode)
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached_frame(source_path, build, cache_dir, derive=None):
+    """Return the cleaned frame for source_path, from cache when it is current.
+
+    On a miss, build(source_path) produces the frame and derive(frame)
+    whatever is computed from it (the snapshot's indexes); both are written
+    to a new cache entry (atomically, so concurrent workers never read a
+    partial one) and then reloaded memory-mapped. Returns (frame, derived, hit).
+    """
+    fingerprint = source_fingerprint(source_path)
+    entry = os.path.join(cache_dir, cache_key(fingerprint))
+
+    if os.path.exists(os.path.join(entry, 'manifest.json')):
+        try:
+            return read_frame(entry), read_state(entry), True
+        except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            print(f"⚠️  Ignoring unreadable cache {entry}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    df = build(source_path)
+    derived = derive(df) if derive else None
+
+    def write(staging):
+        write_state(staging, derived)
+        # The manifest goes last: an entry without one is never read
+        write_frame(staging, df, fingerprint)
+
+    _publish(cache_dir, entry, write)
+    return read_frame(entry), read_state(entry), False
+
+
+def load_cached_store(source_path, build, read, cache_dir):
+    """Return a store built chunk by chunk for source_path, from cache when current.
+
+    Like load_cached_frame, but build(source_path, directory, fingerprint)
+    writes the entry itself (see FrameWriter), so the source never has to
+    fit in memory. read(directory) opens an entry. Returns (store, hit).
+    """
+    fingerprint = source_fingerprint(source_path)
+    entry = os.path.join(cache_dir, cache_key(fingerprint, layout='store'))
+
+    if os.path.exists(os.path.join(entry, 'manifest.json')):
+        try:
+            return read(entry), True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Ignoring unreadable cache {entry}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    _publish(cache_dir, entry, lambda staging: build(source_path, staging, fingerprint))
+    return read(entry), False
+
+
+def _publish(cache_dir, entry, write):
+    """Have write(directory) fill a staging directory, then rename it to entry"""
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.building-', dir=cache_dir)
+    try:
+        write(staging)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another worker published the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    prune_cache(cache_dir, keep=os.path.basename(entry))
+
+
+def prune_cache(cache_dir, keep):
+    """Remove cache entries other than the current one"""
+    for name in os.listdir(cache_dir):
+        if name != keep and not name.startswith('.building-'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
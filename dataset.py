@@ -0,0 +1,432 @@
+# dataset.py - Immutable dataset snapshots with background hot reload
+import contextlib
+import csv
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+
+import pandas as pd
+
+from aggregates import SpendCube
+from data_cache import load_cached_frame, load_cached_store
+from filters import FilterIndex
+from ingest import PURCHASE_SCHEMA, load_purchase_csv, read_appended_rows, sample_purchase_frame
+from records import SortIndex
+from segments import append_rows, column_categories
+from streaming import build_store, read_store
+from timeseries import TimeSeriesIndex
+from vendors import VendorSearchIndex, align_vendor_names, normalize_vendor_name, normalize_vendor_names
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process build lock
+    fcntl = None
+
+_versions = itertools.count(1)
+
+# Watcher state meaning no changed signature is waiting to settle
+_SETTLED = object()
+
+
+def load_frame(path, cache_dir, sample_fallback=False):
+    """(cleaned purchase frame, prebuilt indexes) for path.
+
+    With a cache directory, the frame and its snapshot indexes come from the
+    columnar cache; otherwise the indexes are None and the snapshot builds them.
+    A missing file is an error unless sample_fallback (first load only) is set.
+    """
+    if not os.path.exists(path):
+        if not sample_fallback:
+            raise FileNotFoundError(f"{path} not found")
+        print(f"⚠️  {path} not found. Creating sample data...")
+        df = sample_purchase_frame()
+        print("🔄 Using sample data for demonstration")
+        return df, None
+
+    indexes = None
+    if cache_dir:
+        # Cleaned columns and derived indexes are cached on disk and memory-mapped (see data_cache.py)
+        with cache_lock(cache_dir):
+            df, indexes, cache_hit = load_cached_frame(path, load_purchase_csv, cache_dir, build_indexes)
+        print(f"💾 Columnar cache {'hit' if cache_hit else 'rebuilt'} in {cache_dir}")
+    else:
+        # Typed, vectorized ingestion (see ingest.py)
+        df = load_purchase_csv(path)
+    print(f"✅ Loaded {len(df)} records from {path}")
+    return df, indexes
+
+
+def build_indexes(df):
+    """Spend cube, filter, time series and sort indexes of a frame, as DatasetSnapshot keywords"""
+    if df.empty:
+        return {}
+    cube = SpendCube.from_frame(df)
+    print(f"🧊 Built spend cube: {cube.group_count} groups from {len(df)} rows")
+    return {
+        'cube': cube,
+        'filter_index': FilterIndex(df),
+        'timeseries': TimeSeriesIndex(df),
+        'sort_index': SortIndex(df),
+    }
+
+
+@contextlib.contextmanager
+def cache_lock(cache_dir):
+    """Hold the cache directory's build lock.
+
+    Workers noticing the same new file queue on it so only one parses it.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, '.lock'), 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def file_signature(path):
+    """Cheap change check: (mtime, size), or None when the file is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_identity(path):
+    """(device, inode) of a file, to tell an appended file from a replaced one"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class DatasetSnapshot:
+    """One loaded version of the purchase data and everything derived from it.
+
+    Snapshots are fully built before anyone can see them and are never
+    mutated afterwards; a request that holds one keeps a consistent view
+    even while a newer snapshot is swapped in.
+    """
+
+    def __init__(self, df, signature=None, cube=None, filter_index=None, timeseries=None, sort_index=None,
+                 delta=(None, 0), out_of_core=False):
+        self.df = df
+        self.signature = signature
+        self.delta = delta  # (identity, byte offset) of the delta file folded in so far
+        self.out_of_core = out_of_core  # served from an on-disk store, see streaming.py
+        self.version = next(_versions)
+        self.loaded_at = time.time()
+
+        if df.empty:
+            self.cube = None
+            self.filter_index = None
+            self.timeseries = None
+            self.sort_index = None
+            self.total_spend = 0
+            self.total_transactions = 0
+            self.unique_vendors = 0
+        else:
+            if cube is None:
+                # Pre-aggregate once so endpoints never rescan the rows
+                cube = SpendCube.from_frame(df)
+                print(f"🧊 Built spend cube: {cube.group_count} groups from {len(df)} rows")
+            self.cube = cube
+
+            # Row indexes for dateRange/amountRange/department/diversity/status filters
+            self.filter_index = filter_index if filter_index is not None else FilterIndex(df)
+
+            # Daily spend prefix sums for YTD/MTD and date-window trends
+            self.timeseries = timeseries if timeseries is not None else TimeSeriesIndex(df)
+
+            # Presorted row orders for paging through records by amount/date/vendor
+            self.sort_index = sort_index if sort_index is not None else SortIndex(df)
+
+            self.total_spend = self.cube.total_spend()
+            self.total_transactions = self.cube.total_count()
+            self.unique_vendors = self.cube.distinct('vendor')
+
+        self.avg_transaction = self.total_spend / self.total_transactions if self.total_transactions > 0 else 0
+        self._vendor_search = None
+        self._vendor_labels = None  # canonical key -> display name, built on first use
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    def vendor_label(self, name):
+        """Display name of the vendor any spelling of name refers to, or None"""
+        if self.empty:
+            return None
+        if self._vendor_labels is None:
+            names = column_categories(self.df, 'vendor_name')
+            self._vendor_labels = dict(zip(normalize_vendor_names(names), names))
+        return self._vendor_labels.get(normalize_vendor_name(name))
+
+    @property
+    def vendor_search(self):
+        """Typeahead index over the vendor names, built on first use"""
+        if self._vendor_search is None and not self.empty:
+            self._vendor_search = VendorSearchIndex.from_snapshot(column_categories(self.df, 'vendor_name'), self.cube)
+        return self._vendor_search
+
+    @property
+    def tag(self):
+        """Short id of the data this snapshot holds, the same in every worker"""
+        return hashlib.sha256(repr((self.signature, self.delta)).encode()).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, path, cache_dir, sample_fallback=False):
+        signature = file_signature(path)
+        df, indexes = load_frame(path, cache_dir, sample_fallback)
+        return cls(df, signature, **(indexes or {}))
+
+    @classmethod
+    def load_out_of_core(cls, path, store_dir, chunk_rows, sample_fallback=False):
+        """Snapshot of an extract too large for memory, streamed into an on-disk store.
+
+        The CSV is read chunk_rows rows at a time (once per extract version;
+        later loads reopen the store). Aggregates are held in memory, rows
+        stay on disk and are memory-mapped.
+        """
+        if not os.path.exists(path):
+            return cls.load(path, None, sample_fallback)
+        signature = file_signature(path)
+        with cache_lock(store_dir):
+            store, cache_hit = load_cached_store(
+                path, lambda source, directory, fingerprint: build_store(source, directory, fingerprint, chunk_rows),
+                read_store, store_dir)
+        print(f"💾 Out-of-core store {'reopened' if cache_hit else 'built'} in {store_dir}")
+        df, cube, filter_index, timeseries, sort_index = store
+        print(f"✅ Loaded {len(df)} records from {path}")
+        return cls(df, signature, cube, filter_index, timeseries, sort_index, out_of_core=True)
+
+    def append(self, rows, delta):
+        """New snapshot with cleaned rows added; only the new rows are aggregated.
+
+        The rows and their indexes are held beside the current ones rather
+        than copied into them (see segments.py), so the frame and indexes
+        loaded from the cache stay memory-mapped; they are merged in when
+        the extract is next reloaded.
+        """
+        if self.out_of_core:
+            raise ValueError('Rows cannot be appended to an out-of-core dataset')
+        if self.empty:
+            return DatasetSnapshot(rows, self.signature, delta=delta)
+        # New spellings of known vendors take the label already in use, so they group together
+        rows['vendor_name'] = align_vendor_names(column_categories(self.df, 'vendor_name'), rows['vendor_name'])
+        return DatasetSnapshot(
+            append_rows(self.df, rows),
+            self.signature,
+            self.cube.append(rows),
+            self.filter_index.append(rows),
+            self.timeseries.append(rows),
+            self.sort_index.append(rows, len(self.df)),
+            delta,
+        )
+
+
+class DatasetManager:
+    """Holds the current snapshot and keeps it in step with the data files.
+
+    The watcher thread rebuilds the snapshot when the main extract changes
+    and folds in rows appended to the delta file, always off the request
+    path; the new snapshot is published by swapping a single reference,
+    which is atomic. Readers call current() once per request and use that
+    snapshot throughout.
+    """
+
+    def __init__(self, path, cache_dir, interval, delta_path=None, stream_chunk_rows=0):
+        self.path = path
+        self.delta_path = delta_path
+        self.cache_dir = cache_dir
+        self.stream_chunk_rows = stream_chunk_rows  # > 0: out-of-core mode, cache_dir holds the store
+        self.interval = interval
+        self.last_error = None
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+        self._failed_signature = None
+        # Build timings, for the /metrics endpoint
+        self.loads = 0
+        self.load_seconds_total = 0.0
+        self.last_load_seconds = None
+        self.appends = 0
+        self.append_seconds_total = 0.0
+
+    def current(self):
+        return self._snapshot
+
+    def _build(self, sample_fallback=False):
+        """Snapshot of the main extract with the whole delta file replayed on top"""
+        if self.stream_chunk_rows > 0:
+            return DatasetSnapshot.load_out_of_core(self.path, self.cache_dir, self.stream_chunk_rows,
+                                                    sample_fallback)
+        snapshot = DatasetSnapshot.load(self.path, self.cache_dir, sample_fallback)
+        if self.delta_path:
+            snapshot = self._fold_delta(snapshot, (file_identity(self.delta_path), 0)) or snapshot
+        return snapshot
+
+    def _fold_delta(self, snapshot, delta):
+        """snapshot plus the delta rows after delta's offset, or None if there are none"""
+        identity, offset = delta
+        if identity is None:
+            return None
+        rows, offset = read_appended_rows(self.delta_path, offset)
+        if rows is None:
+            return None
+        started = time.perf_counter()
+        snapshot = snapshot.append(rows, (identity, offset))
+        elapsed = time.perf_counter() - started
+        self.appends += 1
+        self.append_seconds_total += elapsed
+        print(f"➕ Appended {len(rows)} records from {self.delta_path} in {elapsed:.2f}s")
+        return snapshot
+
+    def _record_load(self, seconds):
+        self.loads += 1
+        self.load_seconds_total += seconds
+        self.last_load_seconds = seconds
+
+    def load(self):
+        """Initial load; falls back to an empty dataset if it fails"""
+        try:
+            started = time.perf_counter()
+            # Demo data only when there is no extract at startup, never on a reload
+            self._snapshot = self._build(sample_fallback=True)
+            self._record_load(time.perf_counter() - started)
+            self._print_stats(self._snapshot)
+        except Exception as e:
+            print(f"❌ Error loading data: {e}")
+            self.last_error = str(e)
+            self._snapshot = DatasetSnapshot(pd.DataFrame(), file_signature(self.path))
+        return self._snapshot
+
+    def reload(self):
+        """Build a fresh snapshot and swap it in; the old one stays live on failure"""
+        with self._reload_lock:
+            started = time.perf_counter()
+            signature = file_signature(self.path)
+            try:
+                snapshot = self._build()
+            except Exception as e:
+                print(f"❌ Reload failed, keeping dataset v{self._snapshot.version}: {e}")
+                self.last_error = str(e)
+                # Not retried until the file changes again
+                self._failed_signature = signature
+                return False
+            self._snapshot = snapshot
+            self.last_error = None
+            self._record_load(time.perf_counter() - started)
+            print(f"🔄 Swapped in dataset v{snapshot.version} in {self.last_load_seconds:.1f}s")
+            self._print_stats(snapshot)
+            return True
+
+    def refresh_delta(self):
+        """Fold rows appended to the delta file since the current snapshot into it.
+
+        A delta file that was replaced or truncated (e.g. rotated once the
+        main extract caught up) triggers a full reload instead.
+        """
+        if not self.delta_path:
+            return False
+        with self._reload_lock:
+            current = self._snapshot
+            identity, offset = current.delta
+            new_identity = file_identity(self.delta_path)
+            rotated = identity is not None and new_identity != identity
+            truncated = new_identity is not None and os.path.getsize(self.delta_path) < offset
+            if not (rotated or truncated):
+                try:
+                    snapshot = self._fold_delta(current, (new_identity, offset))
+                except Exception as e:
+                    print(f"❌ Append failed, keeping dataset v{current.version}: {e}")
+                    self.last_error = str(e)
+                    return False
+                if snapshot is None:
+                    return False
+                self._snapshot = snapshot
+                self.last_error = None
+                return True
+        return self.reload()
+
+    def append_records(self, records):
+        """Write raw purchase records to the delta file and fold them in.
+
+        Records are dicts keyed by the extract's column names, with values
+        as they appear in the CSV. Other workers pick the rows up from the
+        delta file on their next poll.
+        """
+        if not self.delta_path:
+            raise ValueError('Appending is disabled (no delta file configured)')
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            raise ValueError('Expected a non-empty list of records')
+        # Only the extract's columns, so a request cannot add columns to the delta file
+        unknown = sorted({str(key) for record in records for key in record} - set(PURCHASE_SCHEMA))
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        if not all(isinstance(value, (str, int, float)) or value is None
+                   for record in records for value in record.values()):
+            raise ValueError('Record values must be strings, numbers or null')
+
+        with open(self.delta_path, 'a+', newline='') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            header = f.readline()
+            columns = next(csv.reader([header])) if header else list(PURCHASE_SCHEMA)
+            missing = sorted({key for record in records for key in record} - set(columns))
+            if missing:
+                raise ValueError(f"Delta file has no column for: {', '.join(missing)}")
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+            if not header:
+                writer.writeheader()
+            writer.writerows(records)
+            # One write so readers never see a record cut in half
+            f.write(buffer.getvalue())
+            f.flush()
+        self.refresh_delta()
+        return len(records)
+
+    def ensure_watcher(self):
+        """Start the file watcher in this process (again after a fork)"""
+        if self.interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        thread = threading.Thread(target=self._watch, name='dataset-watcher', daemon=True)
+        thread.start()
+
+    def _watch(self):
+        pending = _SETTLED
+        while True:
+            time.sleep(self.interval)
+            try:
+                pending = self._check(pending)
+            except Exception as e:
+                # e.g. the delta file vanishing mid-check; the watcher must outlive it
+                print(f"❌ Dataset watcher error, retrying in {self.interval}s: {e}")
+                self.last_error = str(e)
+                pending = _SETTLED
+
+    def _check(self, pending):
+        """One watcher pass; returns the signature still waiting to settle, or _SETTLED"""
+        signature = file_signature(self.path)
+        if signature is None:
+            # Extract missing (mid-replace or removed): keep serving the current snapshot
+            return _SETTLED
+        if signature in (self._snapshot.signature, self._failed_signature):
+            self.refresh_delta()
+            return _SETTLED
+        # Wait for the file to stop changing so a half-copied extract is never loaded
+        if signature != pending:
+            return signature
+        self.reload()
+        return _SETTLED
+
+    def _print_stats(self, snapshot):
+        print(f"📊 Stats: ${snapshot.total_spend:,.2f} total, {snapshot.total_transactions} transactions, "
+              f"{snapshot.unique_vendors} vendors")
@@ -0,0 +1,71 @@
+# export.py - Streaming CSV/NDJSON export of the filtered purchase rows
+import numpy as np
+
+from ingest import PURCHASE_SCHEMA
+from json_provider import dumps
+from segments import take_rows
+
+# format param -> mimetype of the streamed body
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Extract columns as read, plus the parsed amount
+EXPORT_COLUMNS = list(PURCHASE_SCHEMA) + ['total_amount_clean']
+
+# Money columns, rounded to cents in both formats
+MONEY_COLUMNS = ('total_amount_clean',)
+
+# Rows encoded per chunk; bounds the memory an export holds at any time
+EXPORT_CHUNK_ROWS = 10_000
+
+
+def _batched(row_blocks, chunk_rows):
+    """Regroup blocks of row ids into batches of at most chunk_rows rows"""
+    pending = []
+    size = 0
+    for rows in row_blocks:
+        while size + len(rows) >= chunk_rows:
+            take = chunk_rows - size
+            yield np.concatenate(pending + [rows[:take]])
+            rows = rows[take:]
+            pending = []
+            size = 0
+        if len(rows):
+            pending.append(rows)
+            size += len(rows)
+    if pending:
+        yield np.concatenate(pending)
+
+
+def export_chunks(df, row_blocks, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the given rows of df encoded as CSV (one header) or NDJSON text.
+
+    Only one batch of rows is materialized at a time, so memory stays flat
+    however many rows are exported. row_blocks is any iterable of row-id
+    arrays, in the order the rows should appear.
+    """
+    columns = [column for column in EXPORT_COLUMNS if column in df.columns]
+    if fmt == 'csv':
+        # Header first, so the download starts before any rows are encoded
+        yield take_rows(df, np.zeros(0, dtype=np.int64), columns).to_csv(index=False)
+    for rows in _batched(row_blocks, chunk_rows):
+        chunk = take_rows(df, rows, columns)
+        for column in MONEY_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = chunk[column].round(2)
+        if fmt == 'csv':
+            yield chunk.to_csv(index=False, header=False)
+        else:
+            yield ''.join(dumps(record) + '\n' for record in _records(chunk))
+
+
+def _records(chunk):
+    """Rows of a chunk as dicts of plain values, missing values as None"""
+    values = [
+        chunk[column].astype(object).where(chunk[column].notna(), None).tolist()
+        for column in chunk.columns
+    ]
+    columns = list(chunk.columns)
+    return (dict(zip(columns, row)) for row in zip(*values))
@@ -0,0 +1,319 @@
+# filters.py - Server-side filter engine backed by precomputed row indexes
+import copy
+
+import numpy as np
+import pandas as pd
+
+from segments import take_rows
+
+# Query params understood by the filter engine (same names dashboard.html sends)
+FILTER_PARAMS = ('dateRange', 'amountRange', 'department', 'diversity', 'status')
+
+# amountRange value -> [low, high) bounds on total_amount_clean
+AMOUNT_BINS = {
+    'under1k': (-np.inf, 1_000),
+    '1k-10k': (1_000, 10_000),
+    '10k-100k': (10_000, 100_000),
+    '100k-1m': (100_000, 1_000_000),
+    'over1m': (1_000_000, np.inf),
+}
+
+# diversity value -> flag columns, any of which must be 'Y'
+DIVERSITY_FLAGS = {
+    'minority': ('MINORITY',),
+    'woman': ('SB WOMAN',),
+    'veteran': ('SB VETERAN',),
+    'diverse': ('MINORITY', 'SB WOMAN', 'SB VETERAN'),
+}
+
+# dateRange value -> days back from the latest input date
+TRAILING_DAYS = {'last30': 30, 'last90': 90}
+
+# Rows unpacked per block when walking a bitmap, bounding per-request memory
+ROW_CHUNK = 1 << 20
+
+
+def _join_bitmaps(head, head_count, tail, tail_count):
+    """Packed bitmap of head_count rows followed by tail_count more"""
+    used = head_count % 8
+    if not used:
+        return np.concatenate([head, tail])
+    # The last byte is partly filled; shift the new bits in behind it
+    bits = np.concatenate([np.unpackbits(head[-1:], count=used), np.unpackbits(tail, count=tail_count)])
+    return np.concatenate([head[:-1], np.packbits(bits)])
+
+
+def parse_filters(args):
+    """Pick the active filters out of request args, dropping 'all' and blanks"""
+    filters = {}
+    for name in FILTER_PARAMS:
+        value = (args.get(name) or '').strip()
+        if value and value.lower() != 'all':
+            filters[name] = value
+    return filters
+
+
+class FilterIndex:
+    """Per-value row indexes for every filterable column.
+
+    Low-cardinality columns (status, diversity flags, amount bins) keep packed
+    row bitmaps; departments keep sorted row-id lists and input dates a sorted
+    permutation. A query ANDs the matching bitmaps and never rescans the frame.
+    """
+
+    def __init__(self, df):
+        self.row_count = len(df)
+        self.status = self._value_bitmaps(df, 'DOCUMENT STATUS DESCRIPTION', key=str.lower)
+        self.flags = {
+            column: self._pack((df[column] == 'Y').to_numpy()) if column in df.columns else self._pack(np.zeros(len(df), dtype=bool))
+            for column in ('MINORITY', 'SB WOMAN', 'SB VETERAN')
+        }
+
+        amounts = df['total_amount_clean'].to_numpy(dtype=float)
+        self.amount_bins = {
+            name: self._pack((amounts >= low) & (amounts < high))
+            for name, (low, high) in AMOUNT_BINS.items()
+        }
+
+        # Department posting lists: row ids grouped by department, ascending
+        codes, uniques = pd.factorize(df['DEPARTMENT NAME'])
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.departments = {
+            value: order[bounds[i]:bounds[i + 1]]
+            for i, value in enumerate(uniques)
+        }
+
+        # Dates: row ids ordered by input_date, unparseable dates excluded
+        dates = df['input_date'].to_numpy(dtype='datetime64[ns]')
+        valid = np.flatnonzero(~np.isnat(dates))
+        order = valid[np.argsort(dates[valid], kind='stable')]
+        self.date_order = order
+        self.sorted_dates = dates[order]
+        self.latest_date = pd.Timestamp(self.sorted_dates[-1]) if len(order) else None
+
+    def append(self, df):
+        """Index over the source rows followed by a cleaned frame's rows.
+
+        The new rows get an index of their own beside this one (see
+        AppendedFilterIndex), so the cost follows df, not the history.
+        """
+        return AppendedFilterIndex(self, FilterIndex(df))
+
+    def extended(self, df):
+        """Like append, but copied into one index: bitmaps and posting lists
+        are extended and the new dates merged into the sorted order.
+
+        Costs the whole index, so it is only used on the appended rows' own index.
+        """
+        added = FilterIndex(df)
+        merged = copy.copy(self)
+        merged.row_count = self.row_count + added.row_count
+        merged.status = self._extend_bitmaps(self.status, added.status, added.row_count)
+        merged.flags = self._extend_bitmaps(self.flags, added.flags, added.row_count)
+        merged.amount_bins = self._extend_bitmaps(self.amount_bins, added.amount_bins, added.row_count)
+
+        merged.departments = dict(self.departments)
+        for value, rows in added.departments.items():
+            rows = rows + self.row_count
+            if value in self.departments:
+                rows = np.concatenate([self.departments[value], rows])
+            merged.departments[value] = rows
+
+        # New rows go after existing rows with the same date, as a stable sort would put them
+        pos = np.searchsorted(self.sorted_dates, added.sorted_dates, side='right')
+        merged.date_order = np.insert(self.date_order, pos, added.date_order + self.row_count)
+        merged.sorted_dates = np.insert(self.sorted_dates, pos, added.sorted_dates)
+        merged.latest_date = pd.Timestamp(merged.sorted_dates[-1]) if len(merged.sorted_dates) else None
+        return merged
+
+    def _extend_bitmaps(self, ours, theirs, added_count):
+        """Per-key bitmaps over this index's rows followed by added_count more"""
+        tail_empty = np.zeros((added_count + 7) // 8, dtype=np.uint8)
+        return {
+            key: _join_bitmaps(ours.get(key, self._empty_bitmap()), self.row_count, theirs.get(key, tail_empty),
+                               added_count)
+            for key in list(ours) + [key for key in theirs if key not in ours]
+        }
+
+    def _pack(self, mask):
+        return np.packbits(mask)
+
+    def _value_bitmaps(self, df, column, key=None):
+        if column not in df.columns:
+            return {}
+        codes, uniques = pd.factorize(df[column])
+        bitmaps = {}
+        for i, value in enumerate(uniques):
+            value = key(value) if key else value
+            bitmap = self._pack(codes == i)
+            # Values that differ only in case share a key; keep the rows of both
+            bitmaps[value] = bitmaps[value] | bitmap if value in bitmaps else bitmap
+        return bitmaps
+
+    def _rows_bitmap(self, rows):
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[rows] = True
+        return self._pack(mask)
+
+    def _empty_bitmap(self):
+        return np.zeros((self.row_count + 7) // 8, dtype=np.uint8)
+
+    def date_bounds(self, date_range):
+        """Translate a dateRange value into a [start, end) timestamp window"""
+        if date_range.isdigit() and len(date_range) == 4:
+            year = int(date_range)
+            return pd.Timestamp(year, 1, 1), pd.Timestamp(year + 1, 1, 1)
+        if self.latest_date is None:
+            return None, None
+        # Relative ranges are anchored on the newest record in the extract
+        end = self.latest_date.normalize() + pd.Timedelta(days=1)
+        if date_range == 'ytd':
+            return pd.Timestamp(self.latest_date.year, 1, 1), end
+        if date_range in TRAILING_DAYS:
+            return end - pd.Timedelta(days=TRAILING_DAYS[date_range]), end
+        raise ValueError(f"Unknown dateRange '{date_range}'")
+
+    def date_rows(self, start, end):
+        """Row ids with start <= input_date < end"""
+        lo, hi = np.searchsorted(self.sorted_dates, [np.datetime64(start), np.datetime64(end)])
+        return self.date_order[lo:hi]
+
+    def bitmaps_for(self, filters):
+        """One packed bitmap per active filter"""
+        bitmaps = []
+        if 'dateRange' in filters:
+            start, end = self.date_bounds(filters['dateRange'])
+            bitmaps.append(self._empty_bitmap() if start is None else self._date_bitmap(start, end))
+        if 'amountRange' in filters:
+            if filters['amountRange'] not in AMOUNT_BINS:
+                raise ValueError(f"Unknown amountRange '{filters['amountRange']}'")
+            bitmaps.append(self._amount_bitmap(filters['amountRange']))
+        if 'department' in filters:
+            bitmaps.append(self._department_bitmap(filters['department']))
+        if 'diversity' in filters:
+            columns = DIVERSITY_FLAGS.get(filters['diversity'])
+            if columns is None:
+                raise ValueError(f"Unknown diversity filter '{filters['diversity']}'")
+            bitmaps.append(np.bitwise_or.reduce([self._flag_bitmap(column) for column in columns]))
+        if 'status' in filters:
+            bitmaps.append(self._status_bitmap(filters['status']))
+        return bitmaps
+
+    # Per-filter bitmaps; ScanFilterIndex (streaming.py) builds them by scanning instead
+
+    def _date_bitmap(self, start, end):
+        return self._rows_bitmap(self.date_rows(start, end))
+
+    def _amount_bitmap(self, name):
+        return self.amount_bins[name]
+
+    def _department_bitmap(self, value):
+        rows = self.departments.get(value)
+        return self._empty_bitmap() if rows is None else self._rows_bitmap(rows)
+
+    def _flag_bitmap(self, column):
+        return self.flags[column]
+
+    def _status_bitmap(self, value):
+        return self.status.get(value.lower(), self._empty_bitmap())
+
+    def select(self, filters):
+        """Packed bitmap of the rows matching every filter, or None for no filtering"""
+        bitmaps = self.bitmaps_for(filters)
+        if not bitmaps:
+            return None
+        return np.bitwise_and.reduce(bitmaps)
+
+    def iter_rows(self, bitmap, chunk_rows=ROW_CHUNK):
+        """Yield the row ids set in a bitmap one block at a time, ascending"""
+        chunk_rows = max(8, chunk_rows - chunk_rows % 8)
+        for start in range(0, self.row_count, chunk_rows):
+            stop = min(start + chunk_rows, self.row_count)
+            if bitmap is None:
+                yield np.arange(start, stop)
+                continue
+            block = np.unpackbits(bitmap[start // 8:(stop + 7) // 8], count=stop - start)
+            rows = np.flatnonzero(block) + start
+            if len(rows):
+                yield rows
+
+
+class AppendedFilterIndex(FilterIndex):
+    """Filter index over a base index's rows followed by appended rows.
+
+    The appended rows keep an index of their own. A query asks both and
+    joins the two bitmaps, so an append never copies the base index, which
+    may be memory-mapped from the cache and shared between workers.
+    """
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+        self.row_count = base.row_count + tail.row_count
+        dates = [date for date in (base.latest_date, tail.latest_date) if date is not None]
+        self.latest_date = max(dates) if dates else None
+
+    def append(self, df):
+        return AppendedFilterIndex(self.base, self.tail.extended(df))
+
+    def bitmaps_for(self, filters):
+        # Relative date ranges are anchored on the newest record of either part
+        base, tail = copy.copy(self.base), copy.copy(self.tail)
+        base.latest_date = tail.latest_date = self.latest_date
+        return [
+            _join_bitmaps(head, self.base.row_count, rest, self.tail.row_count)
+            for head, rest in zip(base.bitmaps_for(filters), tail.bitmaps_for(filters))
+        ]
+
+
+class RowSelection:
+    """The rows matching a filter set, kept as a bitmap instead of a frame copy.
+
+    Aggregates come from the spend cube restricted to the selection; only the
+    rows and columns a caller asks for are ever materialized.
+    """
+
+    def __init__(self, df, index, cube, bitmap, filters=None):
+        self.df = df
+        self.index = index
+        self.cube = cube
+        self.bitmap = bitmap
+        self.filters = filters  # parsed filters the bitmap came from, None if unknown
+        self._view = None
+
+    @property
+    def view(self):
+        """Spend cube over the selected rows"""
+        if self._view is None:
+            if self.bitmap is None:
+                self._view = self.cube
+            else:
+                self._view = self.cube.restrict(self.index.iter_rows(self.bitmap))
+        return self._view
+
+    def __len__(self):
+        return self.view.total_count()
+
+    def narrow(self, filters):
+        """Selection further restricted by extra filters"""
+        bitmaps = self.index.bitmaps_for(filters)
+        if self.bitmap is not None:
+            bitmaps.append(self.bitmap)
+        bitmap = np.bitwise_and.reduce(bitmaps) if bitmaps else None
+        combined = None
+        if self.filters is not None and all(self.filters.get(name, value) == value for name, value in filters.items()):
+            combined = {**self.filters, **filters}
+        return RowSelection(self.df, self.index, self.cube, bitmap, combined)
+
+    def head(self, n, columns=None):
+        """First n selected rows, restricted to the given columns"""
+        taken = []
+        remaining = n
+        for rows in self.index.iter_rows(self.bitmap, chunk_rows=max(ROW_CHUNK, n)):
+            taken.append(rows[:remaining])
+            remaining -= len(taken[-1])
+            if remaining <= 0:
+                break
+        rows = np.concatenate(taken) if taken else np.zeros(0, dtype=np.int64)
+        return take_rows(self.df, rows, columns)
@@ -0,0 +1,29 @@
+# gunicorn.conf.py - Production server settings (picked up automatically by gunicorn)
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '600'))
+
+# Threaded workers: a slow drill-down holds one request thread while it waits
+# on the compute pool (app.py), not the whole worker. Keep GUNICORN_THREADS
+# above COMPUTE_THREADS + COMPUTE_QUEUE so some threads are always left for
+# the HTML pages and cached responses.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+# Load the dataset once in the master and fork workers from it, so the
+# cleaned columns, spend cube and filter indexes are shared copy-on-write
+# instead of being rebuilt privately by every worker. Set GUNICORN_PRELOAD=0
+# to fall back to per-worker loading (the memory-mapped columnar cache is
+# still shared through the page cache in that mode).
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    # Move everything allocated while preloading out of the collector's reach;
+    # otherwise the first gc pass in each worker writes to those object
+    # headers and un-shares their pages.
+    if preload_app:
+        gc.freeze()
@@ -0,0 +1,237 @@
+# ingest.py - Typed, vectorized loading of the purchase extract
+import io
+
+import numpy as np
+import pandas as pd
+
+from vendors import canonical_vendor_names
+
+# Columns the dashboard reads from Purchase data.csv and how to type them.
+# Repetitive text columns are categorical so each distinct value is stored
+# (and cleaned) once; TOTAL AMOUNT stays text until clean_money parses it.
+PURCHASE_SCHEMA = {
+    'TOTAL AMOUNT': 'object',
+    'VENDOR NAME 1': 'category',
+    'DEPARTMENT NAME': 'category',
+    'INPUT DATE': 'category',
+    'MINORITY': 'category',
+    'SB WOMAN': 'category',
+    'SB VETERAN': 'category',
+    'DOCUMENT STATUS DESCRIPTION': 'category',
+}
+
+# Format of INPUT DATE in the extract, e.g. 08/15/2025
+INPUT_DATE_FORMAT = '%m/%d/%Y'
+
+# Rows cleaned per slice in clean_money
+CLEAN_CHUNK_ROWS = 250_000
+
+
+# Byte lookup tables for the vectorized amount parser
+_DIGIT_VALUE = np.full(256, -1, dtype=np.int8)
+_DIGIT_VALUE[ord('0'):ord('9') + 1] = np.arange(10)
+_AMOUNT_CHARS = np.zeros(256, dtype=bool)
+_AMOUNT_CHARS[[ord(c) for c in '0123456789.-$,']] = True
+_AMOUNT_CHARS[0] = True  # fixed-width padding
+_POW10 = 10.0 ** np.arange(19)
+
+
+def _parse_amount_bytes(text):
+    """Parse '$-1,234.56' strings held as fixed-width bytes without Python loops.
+
+    Walks the character positions left to right, folding digits into an
+    integer mantissa (Horner's rule), then scales by the decimals seen.
+    Returns (amounts, parsed); rows with anything besides digits, one '.',
+    a leading '-', '$' and ',' are left unparsed for the slow path.
+    """
+    rows = len(text)
+    # One contiguous array per character position
+    columns = np.ascontiguousarray(text.view(np.uint8).reshape(rows, text.dtype.itemsize).T)
+    mantissa = np.zeros(rows, dtype=np.int64)
+    digits = np.zeros(rows, dtype=np.int32)
+    decimals = np.zeros(rows, dtype=np.int32)
+    seen_dot = np.zeros(rows, dtype=bool)
+    negative = np.zeros(rows, dtype=bool)
+    bad = np.zeros(rows, dtype=bool)
+
+    for chars in columns:
+        values = _DIGIT_VALUE[chars]
+        is_digit = values >= 0
+        is_dot = chars == ord('.')
+        is_minus = chars == ord('-')
+        bad |= ~_AMOUNT_CHARS[chars]
+        bad |= is_dot & seen_dot
+        # A sign is only valid before any digit or decimal point
+        bad |= is_minus & (negative | seen_dot | (digits > 0))
+        mantissa = np.where(is_digit, mantissa * 10 + values, mantissa)
+        digits += is_digit
+        decimals += is_digit & seen_dot
+        seen_dot |= is_dot
+        negative |= is_minus
+
+    # Up to 15 digits fit the mantissa exactly; longer values take the slow path
+    parsed = ~bad & (digits > 0) & (digits <= 15)
+    amounts = np.zeros(rows)
+    amounts[parsed] = mantissa[parsed] / _POW10[decimals[parsed]]
+    amounts[negative] *= -1
+    return amounts, parsed
+
+
+def _clean_money_value(value):
+    """The original per-value parse: strip '$' and ',' and let float() decide"""
+    try:
+        return float(str(value).replace('$', '').replace(',', ''))
+    except ValueError:
+        return 0.0
+
+
+def clean_money(values):
+    """Parse '$1,234.56' style amounts; blanks and unparseable values become 0"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).astype(float)
+    raw = values.to_numpy(dtype=object)
+    amounts = np.zeros(len(raw), dtype=float)
+    # Work in slices so the intermediate arrays stay small on big extracts
+    for start in range(0, len(raw), CLEAN_CHUNK_ROWS):
+        chunk = raw[start:start + CLEAN_CHUNK_ROWS]
+        rows = np.flatnonzero(~pd.isna(chunk))
+        try:
+            text = chunk[rows].astype(bytes)
+        except (UnicodeEncodeError, TypeError, ValueError):
+            text = None
+        if text is not None and text.dtype.itemsize > 0:
+            parsed_amounts, parsed = _parse_amount_bytes(text)
+            amounts[start + rows[parsed]] = parsed_amounts[parsed]
+            rows = rows[~parsed]
+        if len(rows):
+            # Anything unusual (exponents, whitespace, '1_000', non-ASCII digits, text)
+            # is parsed one value at a time, exactly as before the byte parser
+            amounts[start + rows] = [_clean_money_value(value) for value in chunk[rows]]
+    return pd.Series(amounts, index=values.index)
+
+
+def parse_input_dates(values):
+    """Parse INPUT DATE with the fixed extract format, falling back per value"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Parse each distinct date string once, then broadcast through the codes
+        categories = pd.Series(values.cat.categories)
+        parsed = parse_input_dates(categories).to_numpy(dtype='datetime64[ns]')
+        codes = values.cat.codes.to_numpy()
+        dates = np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+        return pd.Series(dates, index=values.index, dtype='datetime64[ns]')
+
+    dates = pd.to_datetime(values, format=INPUT_DATE_FORMAT, errors='coerce')
+    unparsed = dates.isna() & values.notna() & (values.astype(str).str.strip() != '')
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(values[unparsed], format='mixed', errors='coerce')
+    return dates
+
+
+def clean_purchase_frame(df):
+    """Add total_amount_clean, input_date, year, month and vendor_name to a raw purchase frame"""
+    for column, dtype in PURCHASE_SCHEMA.items():
+        if column in df.columns and dtype == 'category' and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+
+    df['total_amount_clean'] = clean_money(df['TOTAL AMOUNT'])
+    df['input_date'] = parse_input_dates(df['INPUT DATE'])
+    df['year'] = df['input_date'].dt.year
+    df['month'] = df['input_date'].dt.month
+    # Vendor grouped by canonical key, labelled with its usual spelling; the codes are vendor IDs (see vendors.py)
+    raw_vendors = df['VENDOR NAME 1'] if 'VENDOR NAME 1' in df.columns else pd.Series(np.nan, index=df.index)
+    df['vendor_name'] = canonical_vendor_names(raw_vendors)
+    return df
+
+
+def read_purchase_csv(path, **kwargs):
+    """Read only the schema columns of a purchase CSV with explicit dtypes"""
+    return pd.read_csv(
+        path,
+        usecols=lambda column: column in PURCHASE_SCHEMA,
+        dtype=PURCHASE_SCHEMA,
+        **kwargs
+    )
+
+
+def load_purchase_csv(path):
+    """Read and clean a purchase CSV"""
+    return clean_purchase_frame(read_purchase_csv(path))
+
+
+def iter_purchase_chunks(path, chunk_rows):
+    """Read and clean a purchase CSV chunk_rows rows at a time.
+
+    Each chunk is cleaned on its own, so its categoricals only hold the
+    values that occur in it.
+    """
+    with read_purchase_csv(path, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield clean_purchase_frame(chunk.reset_index(drop=True))
+
+
+def read_appended_rows(path, offset):
+    """Read and clean the complete lines added to a purchase CSV since offset.
+
+    Returns (frame, new offset); frame is None when nothing new is complete
+    yet. Offset 0 means "just after the header"; a trailing partial line is
+    left for the next call, so a writer mid-append is never half-read.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if not header.endswith(b'\n'):
+            return None, offset
+        start = max(offset, len(header))
+        f.seek(start)
+        chunk = f.read()
+    end = chunk.rfind(b'\n') + 1
+    if end == 0:
+        return None, start
+    df = load_purchase_csv(io.BytesIO(header + chunk[:end]))
+    return (df if len(df) else None), start + end
+
+
+def append_purchase_rows(df, delta):
+    """Cleaned frame with delta's rows after df's.
+
+    Categorical columns stay categorical: values the delta introduces are
+    added after the existing categories, so df's codes are reused as-is.
+    """
+    delta = delta.reindex(columns=df.columns)
+    columns = {}
+    for column in df.columns:
+        old, new = df[column], delta[column]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            categories = old.cat.categories
+            if isinstance(new.dtype, pd.CategoricalDtype):
+                values, new_codes = new.cat.categories, new.cat.codes.to_numpy()
+            else:
+                new_codes, values = pd.factorize(new)
+            mapping = categories.get_indexer(values)
+            unseen = mapping < 0
+            if unseen.any():
+                mapping[unseen] = len(categories) + np.arange(np.count_nonzero(unseen))
+                categories = categories.append(values[unseen])
+            # Missing values keep code -1 (mapping is empty when the delta has none of this column)
+            present = new_codes >= 0
+            delta_codes = np.full(len(new_codes), -1, dtype=np.int64)
+            delta_codes[present] = mapping[new_codes[present]]
+            codes = np.concatenate([old.cat.codes.to_numpy(), delta_codes])
+            columns[column] = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories), validate=False)
+        else:
+            columns[column] = pd.concat([old, new], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def sample_purchase_frame():
+    """Minimal cleaned frame used when no data file is present"""
+    sample_data = {
+        'TOTAL AMOUNT': ['$1000.00', '$2000.00', '$500.00'],
+        'VENDOR NAME 1': ['Sample Vendor A', 'Sample Vendor B', 'Sample Vendor C'],
+        'DEPARTMENT NAME': ['Finance', 'IT', 'HR'],
+        'INPUT DATE': ['08/01/2025', '08/15/2025', '08/28/2025'],
+        'MINORITY': ['Y', 'N', 'Y'],
+        'SB WOMAN': ['N', 'Y', 'N'],
+        'SB VETERAN': ['N', 'N', 'Y'],
+        'DOCUMENT STATUS DESCRIPTION': ['Posted', 'Posted', 'Posted']
+    }
+    return clean_purchase_frame(pd.DataFrame(sample_data))
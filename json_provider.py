@@ -0,0 +1,75 @@
+# json_provider.py - Flask JSON provider that encodes NumPy and pandas values directly
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # standard library encoder, with the same conversions
+    orjson = None
+
+
+def json_default(o):
+    """JSON form of a value the encoder has no native support for.
+
+    Numeric arrays (and Series, via their arrays) go to orjson natively;
+    everything else is reduced here to plain Python values. Timestamps are
+    ISO 8601 and missing values (NaT, pd.NA) are null.
+    """
+    if isinstance(o, (pd.Series, pd.Index)):
+        return o.to_numpy()
+    if isinstance(o, np.ndarray):
+        if o.dtype.kind == 'M':
+            return [None if np.isnat(value) else str(value) for value in o]
+        return o.tolist()
+    if o is pd.NaT or o is pd.NA:
+        return None
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, pd.Period):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Compact JSON text of obj, with the same conversions as API responses"""
+    if orjson is None:
+        return json.dumps(obj, default=json_default, separators=(',', ':'))
+    return orjson.dumps(obj, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() for NumPy arrays and scalars, pandas Series/Index and timestamps.
+
+    Encodes with orjson when it is installed (NaN becomes null, bodies are
+    built as bytes); otherwise falls back to the standard library encoder.
+    """
+
+    default = staticmethod(json_default)
+
+    def _orjson_options(self, indent=None):
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=json_default, option=self._orjson_options(kwargs.get('indent'))).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=json_default, option=self._orjson_options(indent)) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
@@ -0,0 +1,126 @@
+# metrics.py - Counters and histograms rendered in the Prometheus text format
+import bisect
+import os
+import threading
+
+# Upper bounds (seconds) of the request and phase latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_text(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = ('worker',) + tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        key = (os.getpid(),) + tuple(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = ('worker',) + tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        key = (os.getpid(),) + tuple(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', key + (bound,), cumulative))
+                samples.append((f'{self.name}_sum', key, total))
+                samples.append((f'{self.name}_count', key, cumulative))
+        return samples
+
+
+class Collected:
+    """Gauge or counter values read from elsewhere in the process at render time"""
+
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = ('worker',) + tuple(labels)
+        self.read = read  # () -> {label values tuple: value}, None values skipped
+
+    def samples(self):
+        return [(self.name, (os.getpid(),) + tuple(key), value)
+                for key, value in sorted(self.read().items()) if value is not None]
+
+
+class MetricsRegistry:
+    """The metrics of one worker process; every series carries a worker (pid) label"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(self.prefix + name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def collected(self, name, help, read, labels=(), kind='gauge'):
+        return self._add(Collected(self.prefix + name, help, read, labels, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in metric.samples():
+                names = metric.labels + ('le',) if name.endswith('_bucket') else metric.labels
+                values = key[:-1] + (_number(key[-1]),) if name.endswith('_bucket') else key
+                lines.append(f'{name}{_label_text(names, values)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,48 @@
+# process_memory.py - Per-process memory accounting from /proc (Linux)
+import os
+
+# smaps_rollup fields reported, in kB
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def memory_usage(pid='self'):
+    """RSS, PSS, unique (USS) and shared memory of a process in MiB.
+
+    USS - the private pages only this process holds - is what each extra
+    worker really costs; pages shared with the master or the page cache
+    (memory-mapped dataset columns) are counted once across all workers.
+    """
+    values = dict.fromkeys(SMAPS_FIELDS, 0)
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in values:
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        return None
+    to_mb = 1 / 1024
+    return {
+        'pid': os.getpid() if pid == 'self' else int(pid),
+        'rss_mb': values['Rss'] * to_mb,
+        'pss_mb': values['Pss'] * to_mb,
+        'uss_mb': (values['Private_Clean'] + values['Private_Dirty']) * to_mb,
+        'shared_mb': (values['Shared_Clean'] + values['Shared_Dirty']) * to_mb,
+    }
+
+
+def child_pids(pid):
+    """Direct children of a process, e.g. the workers of a gunicorn master"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == int(pid):
+            children.append(int(entry))
+    return sorted(children)
@@ -0,0 +1,257 @@
+# records.py - Presorted row orders for paging through the filtered records
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# sort param -> column the rows are ordered by
+SORT_COLUMNS = {
+    'amount': 'total_amount_clean',
+    'date': 'input_date',
+    'vendor': 'vendor_name',
+}
+
+SORT_ORDERS = ('asc', 'desc')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Set bits per byte value, for counting a packed bitmap without unpacking it
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+
+
+def bitmap_count(bitmap):
+    """Number of rows set in a packed row bitmap"""
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+: a popcount instruction per byte
+        return int(np.bitwise_count(bitmap).sum(dtype=np.int64))
+    return int(_POPCOUNT[bitmap].sum())
+
+
+def _selected(bitmap, rows):
+    """Mask of which row ids are set in a packed (big-endian) bitmap"""
+    return ((bitmap[rows >> 3] >> (7 - (rows & 7)).astype(np.uint8)) & 1).astype(bool)
+
+
+def _sort_values(values):
+    """Comparable values of a column, an integer sort key and a missing mask.
+
+    Categoricals sort by their category rank, so building the order never
+    compares strings row by row.
+    """
+    missing = pd.isna(values).to_numpy()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = np.asarray(values.cat.categories, dtype=object)
+        rank = np.empty(len(categories), dtype=np.int64)
+        rank[np.argsort(categories, kind='stable')] = np.arange(len(categories))
+        codes = values.cat.codes.to_numpy()
+        key = np.where(codes >= 0, rank[codes], 0)
+        return np.asarray(values, dtype=object), key, missing
+    if pd.api.types.is_datetime64_any_dtype(values):
+        key = values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        return key, key, missing
+    key = values.to_numpy(dtype=float)
+    return key, key, missing
+
+
+class SortOrder:
+    """Row ids ordered ascending by one column, missing values last.
+
+    Ties keep ascending row order. The descending order is the sorted part
+    read backwards (so ties run newest row first), missing values still last.
+    """
+
+    def __init__(self, rows, sorted_values, missing_rows):
+        self.rows = rows                    # non-missing row ids, ascending by value
+        self.sorted_values = sorted_values  # their values, for merging appended rows
+        self.missing_rows = missing_rows    # row ids with no value, ascending
+
+    @classmethod
+    def from_values(cls, values, start=0):
+        values, key, missing = _sort_values(values)
+        present = np.flatnonzero(~missing)
+        rows = present[np.argsort(key[present], kind='stable')]
+        return cls((rows + start).astype(np.int64), values[rows], np.flatnonzero(missing) + start)
+
+    @property
+    def sorted_count(self):
+        return len(self.rows)
+
+    def __len__(self):
+        return self.sorted_count + len(self.missing_rows)
+
+    def _sorted(self, start, stop):
+        """Row ids at positions [start, stop) of the ascending sorted part"""
+        return self.rows[start:stop]
+
+    def _missing(self, start, stop):
+        return self.missing_rows[start:stop]
+
+    def positions(self, order, start, stop):
+        """Row ids at positions [start, stop) of the asc or desc order"""
+        n_sorted = self.sorted_count
+        parts = []
+        if start < n_sorted:
+            end = min(stop, n_sorted)
+            if order == 'asc':
+                parts.append(self._sorted(start, end))
+            else:
+                parts.append(self._sorted(n_sorted - end, n_sorted - start)[::-1])
+        if stop > n_sorted:
+            parts.append(self._missing(max(start - n_sorted, 0), stop - n_sorted))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def appended(self, added):
+        """Order over these rows and an already sorted block of later rows,
+        merged per query instead of copied (see AppendedSortOrder)"""
+        return AppendedSortOrder(self, added)
+
+    def merged(self, added):
+        """Order over these rows and an already sorted block of later rows.
+
+        Each new row is placed after existing rows with an equal value, so
+        the merge is a binary search per new row plus one array copy; it is
+        only used on the appended rows' own order.
+        """
+        at = np.searchsorted(self.sorted_values, added.sorted_values, side='right')
+        return SortOrder(
+            np.insert(self.rows, at, added.rows),
+            np.insert(self.sorted_values, at, added.sorted_values),
+            np.concatenate([self.missing_rows, added.missing_rows]),
+        )
+
+
+class AppendedSortOrder(SortOrder):
+    """A base SortOrder followed by a sorted block of appended rows.
+
+    Where each appended row lands in the merged order is found once, by
+    binary search; a query interleaves the two over the positions it reads,
+    so the base arrays (memory-mapped from the cache) are never copied.
+    """
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+        # Merged position of each appended row: after base rows with an equal value, as a stable sort puts it
+        self.tail_at = (np.searchsorted(base.sorted_values, tail.sorted_values, side='right')
+                        + np.arange(len(tail.rows)))
+
+    @property
+    def sorted_count(self):
+        return len(self.base.rows) + len(self.tail.rows)
+
+    def __len__(self):
+        return len(self.base) + len(self.tail)
+
+    def _sorted(self, start, stop):
+        lo, hi = np.searchsorted(self.tail_at, [start, stop])
+        appended = self.tail_at[lo:hi] - start
+        rows = np.empty(stop - start, dtype=np.int64)
+        from_base = np.ones(stop - start, dtype=bool)
+        from_base[appended] = False
+        rows[appended] = self.tail.rows[lo:hi]
+        rows[from_base] = self.base.rows[start - lo:stop - hi]
+        return rows
+
+    def _missing(self, start, stop):
+        n_base = len(self.base.missing_rows)
+        return np.concatenate([self.base.missing_rows[start:stop],
+                               self.tail.missing_rows[max(start - n_base, 0):max(stop - n_base, 0)]])
+
+    def appended(self, added):
+        return AppendedSortOrder(self.base, self.tail.merged(added))
+
+
+class SortIndex:
+    """Presorted row orders for every sortable column, built at load time.
+
+    A page of a sorted view walks the matching order from the requested
+    position and keeps the rows set in the filter bitmap, so the cost
+    follows the page (and how sparse the filter is), never a full sort.
+    """
+
+    def __init__(self, df, orders=None):
+        self.row_count = len(df)
+        if orders is None:
+            orders = {
+                name: SortOrder.from_values(df[column]) if column in df.columns
+                else SortOrder(np.zeros(0, dtype=np.int64), np.zeros(0), np.arange(len(df)))
+                for name, column in SORT_COLUMNS.items()
+            }
+        self.orders = orders
+
+    def append(self, df, start):
+        """Index over the source rows followed by a cleaned frame's rows, numbered from start"""
+        orders = {}
+        for name, column in SORT_COLUMNS.items():
+            if column in df.columns:
+                added = SortOrder.from_values(df[column].reset_index(drop=True), start)
+            else:
+                added = SortOrder(np.zeros(0, dtype=np.int64), np.zeros(0), np.arange(len(df)) + start)
+            orders[name] = self.orders[name].appended(added)
+        merged = SortIndex.__new__(SortIndex)
+        merged.row_count = start + len(df)
+        merged.orders = orders
+        return merged
+
+    def page(self, sort, order, bitmap, position, limit, skip=0):
+        """Up to limit selected row ids in sort order, starting at a position.
+
+        skip drops that many selected rows first (offset paging). Returns the
+        rows and the position just after the last one, to resume from.
+        """
+        sort_order = self.orders[sort]
+        if bitmap is None:
+            start = min(position + skip, self.row_count)
+            stop = min(start + limit, self.row_count)
+            return sort_order.positions(order, start, stop), stop
+
+        taken = []
+        needed = limit
+        block = max(4 * (limit + skip), 1024)
+        while position < self.row_count and needed > 0:
+            stop = min(position + block, self.row_count)
+            rows = sort_order.positions(order, position, stop)
+            hits = np.flatnonzero(_selected(bitmap, rows))
+            if skip:
+                dropped = min(skip, len(hits))
+                hits = hits[dropped:]
+                skip -= dropped
+            hits = hits[:needed]
+            if len(hits):
+                taken.append(rows[hits])
+                needed -= len(hits)
+            if needed == 0:
+                stop = position + int(hits[-1]) + 1
+            position = stop
+            # Sparse filters need longer walks; grow the block to bound the iterations
+            block *= 2
+        rows = np.concatenate(taken) if taken else np.zeros(0, dtype=np.int64)
+        return rows, position
+
+    def iter_rows(self, sort, order, bitmap, chunk_rows):
+        """Yield the selected row ids in sort order, walking chunk_rows positions at a time"""
+        sort_order = self.orders[sort]
+        for start in range(0, self.row_count, chunk_rows):
+            rows = sort_order.positions(order, start, min(start + chunk_rows, self.row_count))
+            if bitmap is not None:
+                rows = rows[_selected(bitmap, rows)]
+            if len(rows):
+                yield rows
+
+
+def cursor_token(dataset_tag, sort, order, filters):
+    """Tag tying a cursor to the dataset, sort and filters it was issued for"""
+    scope = repr((dataset_tag, sort, order, sorted(filters.items())))
+    return hashlib.sha256(scope.encode()).hexdigest()[:12]
+
+
+def encode_cursor(position, token):
+    return f"{position}.{token}"
+
+
+def decode_cursor(cursor, token):
+    """Position encoded in a cursor; ValueError if it belongs to another view"""
+    position, _, cursor_tag = cursor.partition('.')
+    if not position.isdigit() or cursor_tag != token:
+        raise ValueError('Cursor does not match this dataset, sort or filters; start again without it')
+    return int(position)
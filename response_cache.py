@@ -0,0 +1,108 @@
+# response_cache.py - LRU cache of rendered API responses with strong ETags
+import hashlib
+import threading
+from collections import OrderedDict
+
+from filters import FILTER_PARAMS
+
+
+def request_key(path, args):
+    """Cache key for a request: path plus its query params in canonical order.
+
+    Blank params and filter params set to 'all' are dropped, the same way
+    the filter engine ignores them, so equivalent URLs share one entry.
+    """
+    params = []
+    for name in sorted(args.keys()):
+        for value in args.getlist(name):
+            value = value.strip()
+            if not value or (name in FILTER_PARAMS and value.lower() == 'all'):
+                continue
+            params.append((name, value))
+    return path, tuple(params)
+
+
+def body_etag(body):
+    """Strong ETag for a response body"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class CachedResponse:
+    """A rendered response body with what is needed to replay it"""
+
+    def __init__(self, body, mimetype, etag):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class ResponseCache:
+    """Size-bounded LRU of responses for one dataset version.
+
+    Entries belong to the dataset version they were rendered from; the
+    first lookup against a newer version empties the cache. Versions are
+    the per-process snapshot numbers, which only ever increase.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_current(self, version):
+        """Move the cache forward to a newer version; False for a stale one"""
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+        return True
+
+    def get(self, version, key):
+        """Cached response for key under a dataset version, or None"""
+        with self._lock:
+            entry = self._entries.get(key) if self._is_current(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key, entry):
+        with self._lock:
+            # A request still finishing on a replaced snapshot must not evict the new version
+            if not self._is_current(version):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'dataset_version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,107 @@
+# segments.py - Appended rows kept beside a snapshot's base rows instead of copied into them
+import numpy as np
+import pandas as pd
+
+from ingest import append_purchase_rows
+
+
+class AppendedArray:
+    """A per-row array over base rows followed by appended rows.
+
+    Only row-id lookups are supported, which is all the per-row arrays of
+    the cube and time series are used for; the base array (often
+    memory-mapped from the cache) is never copied.
+    """
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+
+    def __len__(self):
+        return len(self.base) + len(self.tail)
+
+    def __getitem__(self, rows):
+        rows = np.asarray(rows)
+        appended = rows >= len(self.base)
+        if not appended.any():
+            return self.base[rows]
+        values = np.empty(len(rows), dtype=np.result_type(self.base.dtype, self.tail.dtype))
+        values[~appended] = self.base[rows[~appended]]
+        values[appended] = self.tail[rows[appended] - len(self.base)]
+        return values
+
+
+def append_values(array, values):
+    """array followed by values; only the appended part is ever copied"""
+    if isinstance(array, AppendedArray):
+        return AppendedArray(array.base, np.concatenate([array.tail, values]))
+    return AppendedArray(array, np.asarray(values))
+
+
+class AppendedFrame:
+    """A cleaned purchase frame followed by appended rows, held as two frames.
+
+    The appended rows are one small frame whose categoricals extend the
+    base frame's categories, so base codes stay valid in it. Rows are read
+    by id with take_rows; the base frame is never copied, so a memory-mapped
+    frame shared between workers stays shared.
+    """
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+
+    @property
+    def columns(self):
+        return self.base.columns
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def __len__(self):
+        return len(self.base) + len(self.tail)
+
+    def take(self, rows, columns):
+        """Rows by id, in the given order, restricted to the given column names"""
+        rows = np.asarray(rows, dtype=np.int64)
+        appended = rows >= len(self.base)
+        head = self.base.iloc[rows[~appended], [self.base.columns.get_loc(column) for column in columns]]
+        if not appended.any():
+            return head
+        tail = self.tail.iloc[rows[appended] - len(self.base), [self.tail.columns.get_loc(column) for column in columns]]
+        tail.index = tail.index + len(self.base)
+        # Put the base categories in the tail's (a prefix of them) so the columns keep their dtype
+        for column in columns:
+            if isinstance(tail[column].dtype, pd.CategoricalDtype):
+                head[column] = pd.Categorical.from_codes(head[column].cat.codes, dtype=tail[column].dtype)
+        taken = pd.concat([head, tail])
+        order = np.concatenate([np.flatnonzero(~appended), np.flatnonzero(appended)])
+        return taken.iloc[np.argsort(order, kind='stable')]
+
+
+def append_rows(frame, rows):
+    """AppendedFrame of frame followed by a cleaned frame's rows.
+
+    Costs the appended rows (all of them so far, if frame already has
+    some), not the base frame's.
+    """
+    if isinstance(frame, AppendedFrame):
+        return AppendedFrame(frame.base, append_purchase_rows(frame.tail, rows))
+    return AppendedFrame(frame, append_purchase_rows(frame.iloc[:0], rows))
+
+
+def take_rows(frame, rows, columns=None):
+    """Rows of a frame or AppendedFrame by id, in order, optionally only some column names"""
+    columns = list(frame.columns) if columns is None else columns
+    if isinstance(frame, AppendedFrame):
+        return frame.take(rows, columns)
+    return frame.iloc[rows, [frame.columns.get_loc(column) for column in columns]]
+
+
+def column_categories(frame, column):
+    """Categories of a categorical column of a frame or AppendedFrame"""
+    if isinstance(frame, AppendedFrame):
+        # The appended rows' categories start with the base frame's
+        return frame.tail[column].cat.categories
+    return frame[column].cat.categories
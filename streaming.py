@@ -0,0 +1,249 @@
+# streaming.py - Out-of-core datasets: chunked ingest into an on-disk store, queried by scans
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from aggregates import SpendCube
+from data_cache import FrameWriter, read_arrays, read_frame
+from filters import AMOUNT_BINS, ROW_CHUNK, FilterIndex
+from ingest import iter_purchase_chunks
+from records import SORT_COLUMNS
+from timeseries import TimeSeriesIndex, day_label, day_number
+from vendors import align_vendor_names
+
+# Raw columns left out of the store: TOTAL AMOUNT is kept as total_amount_clean,
+# and its text is nearly unique per row, so its dictionary would be as big as the data
+STORE_SKIP_COLUMNS = ('TOTAL AMOUNT',)
+
+# Pickled running aggregates (spend cube and time series, no per-row arrays) in a store
+AGGREGATES_FILE = 'aggregates.pkl'
+
+
+def build_store(path, directory, fingerprint, chunk_rows):
+    """Stream a purchase CSV into an on-disk store, chunk_rows rows at a time.
+
+    Each cleaned chunk is aggregated on its own and its columns, its rows'
+    day numbers and their chunk-local cube groups are appended to the
+    store's column files. Chunk aggregates are folded into the running
+    spend cube and time series in batches, and the batch's rows then get
+    their final group ids. Memory holds one chunk plus the aggregates,
+    never the whole extract. A vendor keeps the label (spelling) it got in
+    the first chunk naming it.
+    """
+    writer = FrameWriter(directory, fingerprint)
+    cube = timeseries = None
+    pending = []  # (first row, chunk cube, chunk series) not folded in yet
+    vendor_names = pd.Index([], dtype=object)  # vendor labels given so far
+    for chunk in iter_purchase_chunks(path, chunk_rows):
+        chunk['vendor_name'] = align_vendor_names(vendor_names, chunk['vendor_name'])
+        labels = chunk['vendor_name'].cat.categories
+        vendor_names = vendor_names.append(labels[vendor_names.get_indexer(labels) < 0])
+        partial = SpendCube.from_frame(chunk)
+        added = TimeSeriesIndex(chunk)
+        stored = chunk.drop(columns=[column for column in STORE_SKIP_COLUMNS if column in chunk.columns])
+        start = writer.rows
+        writer.append(stored, row_group=partial.row_group.astype(np.int32), row_day=added.row_day)
+        partial.row_group = partial.row_amount = None
+        added.row_day = added.row_amount = None
+        print(f"🌊 Streamed {writer.rows:,} rows into {directory}")
+
+        if cube is None:
+            # The first chunk's groups are numbered from 0 already
+            cube, timeseries = partial, added
+            continue
+        pending.append((start, partial, added))
+        # Fold once the batch holds as many groups as the cube: each fold walks
+        # the whole cube, so this keeps the total cost linear in the extract
+        if sum(queued.group_count for _, queued, _ in pending) >= cube.group_count:
+            cube, timeseries = _fold_pending(writer, cube, timeseries, pending)
+            pending = []
+
+    if pending:
+        cube, timeseries = _fold_pending(writer, cube, timeseries, pending)
+    with open(os.path.join(directory, AGGREGATES_FILE), 'wb') as f:
+        pickle.dump({'cube': cube, 'timeseries': timeseries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # The manifest goes last: an entry without one is never read
+    writer.close()
+
+
+def _fold_pending(writer, cube, timeseries, pending):
+    """Fold a batch of chunk aggregates in and give the chunks' rows their final group ids"""
+    cube, group_maps = cube.merge([partial for _, partial, _ in pending])
+    timeseries = timeseries.merge([added for _, _, added in pending])
+    bounds = [start for start, _, _ in pending[1:]] + [writer.rows]
+    for (start, _, _), stop, group_ids in zip(pending, bounds, group_maps):
+        writer.remap('row_group', start, stop, group_ids.astype(np.int32))
+    return cube, timeseries
+
+
+def read_store(directory):
+    """(frame, cube, filter index, time series, sort index) of a store.
+
+    Columns and per-row arrays stay memory-mapped; only the aggregates
+    and each text column's dictionary are loaded into memory.
+    """
+    df = read_frame(directory)
+    arrays = read_arrays(directory)
+    with open(os.path.join(directory, AGGREGATES_FILE), 'rb') as f:
+        aggregates = pickle.load(f)
+    cube, timeseries = aggregates['cube'], aggregates['timeseries']
+    if df.empty:
+        return df, None, None, None, None
+
+    amounts = df['total_amount_clean'].to_numpy()
+    cube.row_group, cube.row_amount = arrays['row_group'], amounts
+    timeseries.row_day, timeseries.row_amount = arrays['row_day'], amounts
+    return df, cube, ScanFilterIndex(df, timeseries.row_day, timeseries.latest_day), timeseries, ScanSortIndex(df)
+
+
+def _blocks(row_count):
+    """[start, stop) of each ROW_CHUNK block of rows"""
+    for start in range(0, row_count, ROW_CHUNK):
+        yield start, min(start + ROW_CHUNK, row_count)
+
+
+class ScanFilterIndex(FilterIndex):
+    """FilterIndex over an on-disk store, building each filter's bitmap on demand.
+
+    Nothing per row is kept in memory: a filter is one pass over a
+    memory-mapped column, ROW_CHUNK rows at a time, so a query costs a scan
+    rather than a lookup (repeats are served by the response cache).
+    """
+
+    def __init__(self, df, row_day, last_day):
+        self.df = df
+        self.row_count = len(df)
+        self.row_day = row_day  # day number of every row, NO_DAY where undated
+        self.latest_date = pd.Timestamp(day_label(last_day)) if last_day is not None else None
+
+    def append(self, df):
+        raise ValueError('Rows cannot be appended to an out-of-core dataset')
+
+    def _scan(self, match):
+        """Packed bitmap of the rows where match(start, stop) is set"""
+        bitmap = np.empty((self.row_count + 7) // 8, dtype=np.uint8)
+        for start, stop in _blocks(self.row_count):
+            # ROW_CHUNK is a multiple of 8, so every block starts on a byte boundary
+            bitmap[start // 8:(stop + 7) // 8] = np.packbits(match(start, stop))
+        return bitmap
+
+    def _category_bitmap(self, column, wanted):
+        """Rows of a text column whose value is one of the categories wanted() picks"""
+        if column not in self.df.columns:
+            return self._empty_bitmap()
+        values = self.df[column].array
+        picked = np.flatnonzero(np.asarray(wanted(values.categories), dtype=bool))
+        if not len(picked):
+            return self._empty_bitmap()
+        codes = values.codes
+        return self._scan(lambda start, stop: np.isin(codes[start:stop], picked))
+
+    def _date_bitmap(self, start, end):
+        low, high = day_number(start), day_number(end)
+        return self._scan(lambda a, b: (self.row_day[a:b] >= low) & (self.row_day[a:b] < high))
+
+    def _amount_bitmap(self, name):
+        low, high = AMOUNT_BINS[name]
+        amounts = self.df['total_amount_clean'].to_numpy()
+        return self._scan(lambda a, b: (amounts[a:b] >= low) & (amounts[a:b] < high))
+
+    def _department_bitmap(self, value):
+        return self._category_bitmap('DEPARTMENT NAME', lambda categories: categories == value)
+
+    def _flag_bitmap(self, column):
+        return self._category_bitmap(column, lambda categories: categories == 'Y')
+
+    def _status_bitmap(self, value):
+        return self._category_bitmap('DOCUMENT STATUS DESCRIPTION',
+                                     lambda categories: categories.str.lower() == value.lower())
+
+
+def _smallest(keys, ties, k):
+    """The k smallest (key, tie) pairs, sorted; partial selection, then a sort of k"""
+    if len(keys) > k:
+        kth = np.partition(keys, k - 1)[k - 1]
+        below = np.flatnonzero(keys < kth)
+        equal = np.flatnonzero(keys == kth)
+        need = k - len(below)
+        if len(equal) > need:
+            equal = equal[np.argpartition(ties[equal], need - 1)[:need]]
+        picked = np.concatenate([below, equal])
+        keys, ties = keys[picked], ties[picked]
+    order = np.lexsort((ties, keys))
+    return keys[order], ties[order]
+
+
+class ScanSortIndex:
+    """Sorted paging over an on-disk store, without presorted row orders.
+
+    A page is a top-k pass over the sort column, k being where the page
+    ends: each ROW_CHUNK block only contributes rows that can still be in
+    the first k. Rows come in the same order as SortIndex pages (ties by
+    row, reversed for desc; missing values last), but positions count
+    selected rows, and deep pages cost more, as k grows with the offset.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.row_count = len(df)
+        self._ranks = {}  # sort -> rank of each category, for text columns
+
+    def _sort_keys(self, sort):
+        """keys(start, stop) -> (ascending key, missing mask) of a block of rows"""
+        column = SORT_COLUMNS[sort]
+        if column not in self.df.columns:
+            return lambda start, stop: (np.zeros(stop - start), np.ones(stop - start, dtype=bool))
+        series = self.df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Text sorts by category rank, as in SortIndex
+            rank = self._ranks.get(sort)
+            if rank is None:
+                categories = np.asarray(series.cat.categories, dtype=object)
+                rank = self._ranks[sort] = np.empty(len(categories), dtype=np.int64)
+                rank[np.argsort(categories, kind='stable')] = np.arange(len(categories))
+            codes = series.array.codes
+            return lambda start, stop: (rank[np.maximum(codes[start:stop], 0)], codes[start:stop] < 0)
+        values = series.to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            return lambda start, stop: (values[start:stop].view(np.int64), np.isnat(values[start:stop]))
+        return lambda start, stop: (values[start:stop].astype(float), np.isnan(values[start:stop]))
+
+    def page(self, sort, order, bitmap, position, limit, skip=0):
+        """Up to limit selected row ids in sort order, from the position-th selected row.
+
+        skip drops that many selected rows first (offset paging). Returns the
+        rows and the position just after the last one, to resume from.
+        """
+        start_at = position + skip
+        k = start_at + limit
+        sort_keys = self._sort_keys(sort)
+        sign = 1 if order == 'asc' else -1
+        best_keys = best_ties = None
+        missing, n_missing = [], 0
+        for start, stop in _blocks(self.row_count):
+            keys, absent = sort_keys(start, stop)
+            rows = np.arange(start, stop)
+            if bitmap is not None:
+                selected = np.unpackbits(bitmap[start // 8:(stop + 7) // 8], count=stop - start).view(bool)
+                keys, absent, rows = keys[selected], absent[selected], rows[selected]
+            if n_missing < k:
+                missing.append(rows[absent][:k - n_missing])
+                n_missing += len(missing[-1])
+            # Descending: negate keys and row ids, so ties run newest row first
+            keys, ties = sign * keys[~absent], sign * rows[~absent]
+            if best_keys is not None:
+                if len(best_keys) == k:
+                    within = keys <= best_keys[-1]
+                    keys, ties = keys[within], ties[within]
+                keys, ties = np.concatenate([best_keys, keys]), np.concatenate([best_ties, ties])
+            best_keys, best_ties = _smallest(keys, ties, k)
+
+        sorted_rows = [] if best_ties is None else [sign * best_ties]
+        ordered = np.concatenate(sorted_rows + missing) if sorted_rows or missing else np.zeros(0, dtype=np.int64)
+        rows = ordered[start_at:k]
+        return rows, start_at + len(rows)
+
+    def iter_rows(self, sort, order, bitmap, chunk_rows):
+        raise ValueError('Sorted export is not available for an out-of-core dataset; export without sort')
@@ -0,0 +1,338 @@
+# timeseries.py - Daily spend series with prefix sums for O(1) date-window totals
+import numpy as np
+import pandas as pd
+
+from filters import DIVERSITY_FLAGS
+from segments import append_values
+
+# row_day value for rows whose input_date could not be parsed
+NO_DAY = np.iinfo(np.int32).min
+
+
+def day_number(value):
+    """Days since 1970-01-01 of a date-like value"""
+    return int(np.datetime64(pd.Timestamp(value), 'D').astype(np.int64))
+
+
+def day_label(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+# The dense per-day series span at most [SERIES_FIRST_DAY, SERIES_END_DAY);
+# rows dated outside it (typos such as 1900 or 2099) are left out of them
+# like undated rows, so one bad date cannot stretch every day matrix
+SERIES_FIRST_DAY = day_number('2000-01-01')
+SERIES_END_DAY = day_number('2040-01-01')
+
+
+def _in_series(days):
+    """Mask of the day numbers the dense series cover"""
+    return (days >= SERIES_FIRST_DAY) & (days < SERIES_END_DAY)
+
+
+def _row_days(df):
+    """Day number of every row's input_date, NO_DAY where it is missing"""
+    dates = df['input_date'].to_numpy(dtype='datetime64[ns]')
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    return np.where(np.isnat(dates), NO_DAY, days).astype(np.int32)
+
+
+def _prefix(daily):
+    """Prefix sums along the last axis, with a leading zero column"""
+    pad = [(0, 0)] * (daily.ndim - 1) + [(1, 0)]
+    return np.pad(np.cumsum(daily, axis=-1), pad)
+
+
+def _daily_matrix(codes, days, amounts, n_labels, n_days):
+    """Spend and transaction count per (label, day offset)"""
+    keys = codes * n_days + days
+    size = n_labels * n_days
+    spend = np.bincount(keys, weights=amounts, minlength=size).reshape(n_labels, n_days)
+    count = np.bincount(keys, minlength=size).reshape(n_labels, n_days)
+    return spend, count
+
+
+def _merged_labels(labels, others):
+    """labels followed by the values of others it lacks, in first-seen order"""
+    added = [other[labels.get_indexer(other) < 0] for other in others]
+    if not any(len(values) for values in added):
+        return labels
+    return labels.append(pd.Index(np.concatenate(added)).unique())
+
+
+class DailySeries:
+    """Spend and transactions per calendar day, stored as prefix sums.
+
+    Any [start, end) window total is two lookups; a daily or monthly
+    breakdown costs one lookup per bucket.
+    """
+
+    def __init__(self, first_day, spend_prefix, count_prefix):
+        self.first_day = first_day        # day number of the first bucket
+        self.spend_prefix = spend_prefix  # n_days + 1 running totals, from 0
+        self.count_prefix = count_prefix
+
+    @classmethod
+    def from_daily(cls, first_day, spend, count):
+        return cls(first_day, _prefix(spend), _prefix(count))
+
+    @property
+    def n_days(self):
+        return len(self.spend_prefix) - 1
+
+    @property
+    def last_day(self):
+        return self.first_day + self.n_days - 1
+
+    def _offsets(self, days):
+        return np.clip(np.asarray(days, dtype=np.int64) - self.first_day, 0, self.n_days)
+
+    def window(self, start, end):
+        """(spend, transactions) for start <= day < end, given as day numbers"""
+        spend, count = self.buckets([start, end])
+        return float(spend[0]), int(count[0])
+
+    def buckets(self, edges):
+        """Spend and transactions between consecutive day-number edges"""
+        offsets = self._offsets(edges)
+        # Differences of large running totals pick up float noise; amounts are in cents
+        spend = np.round(np.diff(self.spend_prefix[offsets]), 2)
+        return spend, np.diff(self.count_prefix[offsets])
+
+    def daily(self, start, end):
+        """Spend per day for start <= day < end, labelled 'YYYY-MM-DD'"""
+        days = np.arange(start, max(start, end) + 1)
+        spend, _ = self.buckets(days)
+        return pd.Series(spend, index=np.datetime_as_string(days[:-1].astype('datetime64[D]')))
+
+    def clipped(self, start, end):
+        """Series over the same days with the spend outside start <= day < end dropped"""
+        low, high = self._offsets([start, end])
+        positions = np.clip(np.arange(self.n_days + 1), low, max(low, high))
+        return DailySeries(self.first_day, self.spend_prefix[positions] - self.spend_prefix[low],
+                           self.count_prefix[positions] - self.count_prefix[low])
+
+    def monthly(self, start, end):
+        """Spend per calendar month for start <= day < end, labelled 'YYYY-MM'"""
+        if end <= start:
+            return pd.Series(dtype=float)
+        months = np.arange(np.datetime64(int(start), 'D').astype('datetime64[M]'),
+                           np.datetime64(int(end) - 1, 'D').astype('datetime64[M]') + 1)
+        edges = np.append(months, months[-1] + 1).astype('datetime64[D]').astype(np.int64)
+        edges[0], edges[-1] = start, end
+        spend, _ = self.buckets(edges)
+        return pd.Series(spend, index=months.astype(str))
+
+
+class SegmentSeries:
+    """One DailySeries per label of a segment, as rows of a prefix-sum matrix"""
+
+    def __init__(self, labels, first_day, spend_prefix, count_prefix):
+        self.labels = labels              # pd.Index of segment values
+        self.first_day = first_day
+        self.spend_prefix = spend_prefix  # (labels, n_days + 1)
+        self.count_prefix = count_prefix
+
+    @classmethod
+    def from_daily(cls, labels, first_day, spend, count):
+        return cls(labels, first_day, _prefix(spend), _prefix(count))
+
+    def get(self, label):
+        """DailySeries for one label, or None if it never occurs"""
+        position = self.labels.get_indexer([label])[0]
+        if position < 0:
+            return None
+        return DailySeries(self.first_day, self.spend_prefix[position], self.count_prefix[position])
+
+    def daily_values(self):
+        return np.diff(self.spend_prefix, axis=1), np.diff(self.count_prefix, axis=1)
+
+    def merged(self, others, first_day, n_days):
+        """Segment over a day range covering all of them, with the others' labels added"""
+        labels = _merged_labels(self.labels, [other.labels for other in others])
+        spend = np.zeros((len(labels), n_days))
+        count = np.zeros((len(labels), n_days), dtype=np.int64)
+        for part in [self] + others:
+            part_spend, part_count = part.daily_values()
+            if part_spend.size == 0:
+                continue
+            rows = labels.get_indexer(part.labels)
+            offset = part.first_day - first_day
+            spend[rows, offset:offset + part_spend.shape[1]] += part_spend
+            count[rows, offset:offset + part_count.shape[1]] += part_count
+        return SegmentSeries.from_daily(labels, first_day, spend, count)
+
+
+class VendorSeries:
+    """Daily spend per vendor, kept sparse: only (vendor, day) pairs with spend.
+
+    Entries are grouped by vendor and ordered by day; a vendor's series is
+    expanded to prefix sums on demand, in time proportional to the day range.
+    """
+
+    def __init__(self, labels, start, days, spend, count):
+        self.labels = labels  # pd.Index of vendor names
+        self.start = start    # entries of vendor i are start[i]:start[i + 1]
+        self.days = days      # day number of each entry
+        self.spend = spend
+        self.count = count
+
+    @classmethod
+    def from_entries(cls, labels, codes, days, spend, count):
+        """Aggregate (vendor code, day) entries, which may repeat, into sparse form"""
+        span = int(days.max()) - int(days.min()) + 1 if len(days) else 1
+        base = int(days.min()) if len(days) else 0
+        keys, inverse = np.unique(codes.astype(np.int64) * span + (days - base), return_inverse=True)
+        entry_codes, entry_days = np.divmod(keys, span)
+        return cls(
+            labels,
+            np.searchsorted(entry_codes, np.arange(len(labels) + 1)),
+            (entry_days + base).astype(np.int32),
+            np.bincount(inverse, weights=spend, minlength=len(keys)),
+            np.bincount(inverse, weights=count, minlength=len(keys)).astype(np.int64),
+        )
+
+    def entries(self):
+        """(vendor code, day, spend, count) of every entry"""
+        codes = np.repeat(np.arange(len(self.labels)), np.diff(self.start))
+        return codes, self.days, self.spend, self.count
+
+    def get(self, label, first_day, n_days):
+        """DailySeries for one vendor over [first_day, first_day + n_days)"""
+        position = self.labels.get_indexer([label])[0]
+        if position < 0:
+            return None
+        entries = slice(self.start[position], self.start[position + 1])
+        offsets = self.days[entries] - first_day
+        spend = np.zeros(n_days)
+        count = np.zeros(n_days, dtype=np.int64)
+        spend[offsets] = self.spend[entries]
+        count[offsets] = self.count[entries]
+        return DailySeries.from_daily(first_day, spend, count)
+
+    def merged(self, others):
+        """Series with the others' entries added, re-aggregated in one pass"""
+        labels = _merged_labels(self.labels, [other.labels for other in others])
+        parts = [self.entries()]
+        for other in others:
+            codes, days, spend, count = other.entries()
+            parts.append((labels.get_indexer(other.labels)[codes], days, spend, count))
+        return VendorSeries.from_entries(labels, *(np.concatenate(arrays) for arrays in zip(*parts)))
+
+
+class TimeSeriesIndex:
+    """Daily spend series for the whole dataset and per segment.
+
+    Totals, departments and diversity segments are dense prefix sums, so
+    any date-window total is O(1); vendors are kept sparse and expanded per
+    query. Built once per dataset snapshot, alongside the spend cube.
+    """
+
+    def __init__(self, df):
+        self.row_day = _row_days(df)
+        self.row_amount = df['total_amount_clean'].to_numpy(dtype=float)
+
+        # Newest input date of any row, in the series window or not
+        known = self.row_day[self.row_day != NO_DAY]
+        self.latest_day = int(known.max()) if len(known) else None
+
+        dated = np.flatnonzero(_in_series(self.row_day))
+        days = self.row_day[dated].astype(np.int64)
+        amounts = self.row_amount[dated]
+        self.first_day = int(days.min()) if len(days) else 0
+        n_days = int(days.max()) - self.first_day + 1 if len(days) else 0
+        offsets = days - self.first_day
+
+        spend, count = _daily_matrix(np.zeros(len(dated), dtype=np.int64), offsets, amounts, 1, n_days)
+        self.totals = SegmentSeries.from_daily(pd.Index(['all']), self.first_day, spend, count)
+
+        codes, labels = pd.factorize(df['DEPARTMENT NAME'].to_numpy()[dated])
+        known = codes >= 0
+        spend, count = _daily_matrix(codes[known], offsets[known], amounts[known], len(labels), n_days)
+        self.departments = SegmentSeries.from_daily(pd.Index(labels), self.first_day, spend, count)
+
+        # Diversity segments match the diversity filter: any of the segment's flags set
+        flags = {column: (df[column] == 'Y').to_numpy()[dated] for column in ('MINORITY', 'SB WOMAN', 'SB VETERAN')
+                 if column in df.columns}
+        segments = [name for name, columns in DIVERSITY_FLAGS.items() if all(column in flags for column in columns)]
+        spend = np.zeros((len(segments), n_days))
+        count = np.zeros((len(segments), n_days), dtype=np.int64)
+        for i, name in enumerate(segments):
+            rows = np.logical_or.reduce([flags[column] for column in DIVERSITY_FLAGS[name]])
+            spend[i] = np.bincount(offsets[rows], weights=amounts[rows], minlength=n_days)
+            count[i] = np.bincount(offsets[rows], minlength=n_days)
+        self.diversity = SegmentSeries.from_daily(pd.Index(segments), self.first_day, spend, count)
+
+        codes, labels = pd.factorize(df['vendor_name'].to_numpy()[dated])
+        known = codes >= 0
+        self.vendors = VendorSeries.from_entries(pd.Index(labels), codes[known], days[known],
+                                                 amounts[known], np.ones(np.count_nonzero(known), dtype=np.int64))
+
+    @property
+    def total(self):
+        return self.totals.get('all')
+
+    @property
+    def n_days(self):
+        return self.totals.spend_prefix.shape[1] - 1
+
+    @property
+    def last_day(self):
+        return self.first_day + self.n_days - 1
+
+    def vendor(self, name):
+        """DailySeries of one vendor, or None if it has no dated spend"""
+        return self.vendors.get(name, self.first_day, self.n_days)
+
+    def append(self, df):
+        """Index over the source rows followed by a cleaned frame's rows.
+
+        The new rows are indexed on their own and merged per day and label,
+        so the cost follows the delta and the day range, not the history;
+        the per-row arrays are extended without copying (see segments.py).
+        """
+        merged, added = self.fold(df)
+        merged.row_day = append_values(self.row_day, added.row_day)
+        merged.row_amount = append_values(self.row_amount, added.row_amount)
+        return merged
+
+    def fold(self, df):
+        """Series with a cleaned frame's rows added, and the index of those rows alone.
+
+        The merged index has no per-row arrays; append attaches them.
+        """
+        added = TimeSeriesIndex(df)
+        return self.merge([added]), added
+
+    def merge(self, others):
+        """Series with other indexes' rows added, without per-row arrays.
+
+        Every series is rebuilt once however many indexes are merged, so the
+        streaming loader folds chunk indexes in batches (see streaming.py).
+        """
+        merged = TimeSeriesIndex.__new__(TimeSeriesIndex)
+        merged.row_day = merged.row_amount = None
+        latest = [index.latest_day for index in [self] + others if index.latest_day is not None]
+        merged.latest_day = max(latest, default=None)
+
+        parts = [index for index in [self] + others if index.n_days]
+        merged.first_day = min((index.first_day for index in parts), default=0)
+        n_days = max((index.last_day for index in parts), default=-1) - merged.first_day + 1
+        merged.totals = self.totals.merged([other.totals for other in others], merged.first_day, n_days)
+        merged.departments = self.departments.merged([other.departments for other in others],
+                                                     merged.first_day, n_days)
+        merged.diversity = self.diversity.merged([other.diversity for other in others], merged.first_day, n_days)
+        merged.vendors = self.vendors.merged([other.vendors for other in others])
+        return merged
+
+    def rows_series(self, row_chunks):
+        """DailySeries over a subset of the rows, given as blocks of row ids"""
+        spend = np.zeros(self.n_days)
+        count = np.zeros(self.n_days, dtype=np.int64)
+        for rows in row_chunks:
+            days = self.row_day[rows]
+            dated = _in_series(days)
+            offsets = days[dated].astype(np.int64) - self.first_day
+            spend += np.bincount(offsets, weights=self.row_amount[rows][dated], minlength=self.n_days)
+            count += np.bincount(offsets, minlength=self.n_days)
+        return DailySeries.from_daily(self.first_day, spend, count)
@@ -0,0 +1,220 @@
+# vendors.py - Vendor name canonicalization and typeahead search
+import numpy as np
+import pandas as pd
+
+# Trailing tokens that only name the legal form ("SMITH AND CO" -> "SMITH"),
+# stripped repeatedly; a name is never reduced to nothing
+LEGAL_SUFFIXES = (
+    'INC', 'INCORPORATED', 'LLC', 'L L C', 'LTD', 'LIMITED', 'CO', 'CORP', 'CORPORATION',
+    'COMPANY', 'LP', 'L P', 'LLP', 'PC', 'PLLC', 'PA', 'AND',
+)
+_SUFFIX_PATTERN = r'(?:\s+(?:' + '|'.join(s.replace(' ', r'\s+') for s in LEGAL_SUFFIXES) + r'))+$'
+
+# Characters left after normalization: trigrams are coded over this alphabet
+NAME_ALPHABET = ' 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_CHAR_CODE = np.zeros(256, dtype=np.int64)
+_CHAR_CODE[np.frombuffer(NAME_ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(NAME_ALPHABET))
+
+# Fuzzy matches need at least this trigram similarity (Jaccard) to the query
+FUZZY_MIN_SCORE = 0.3
+
+
+def normalize_vendor_names(names):
+    """Canonical form of raw vendor names (a pd.Index), NaN where nothing is left.
+
+    Upper-cases, spells out '&', turns punctuation into spaces, drops a
+    leading THE and trailing legal-form suffixes, so "Waste Management, Inc."
+    and "WASTE MANAGEMENT" share one key.
+    """
+    keys = (pd.Index(names, dtype=object).astype(str).str.upper()
+            .str.replace('&', ' AND ', regex=False)
+            .str.replace(r'[^0-9A-Z]+', ' ', regex=True)
+            .str.strip()
+            .str.replace(r'^THE\s+(?=\S)', '', regex=True)
+            .str.replace(_SUFFIX_PATTERN, '', regex=True))
+    return keys.where((keys != '') & ~pd.isna(pd.Index(names, dtype=object)))
+
+
+def normalize_vendor_name(name):
+    return normalize_vendor_names([name])[0]
+
+
+def canonical_vendor_names(raw):
+    """Per-row vendor names, one category per canonical vendor, as a sorted categorical.
+
+    Rows are grouped by normalized key, but each group is labelled with its
+    most frequent original spelling ("Sample Vendor A", not "SAMPLE VENDOR
+    A"), which is what charts and search show. Only the distinct raw names
+    are normalized. The categorical codes are the vendor IDs: appends add
+    new vendors after the existing categories, so an ID never changes for
+    the life of a dataset.
+    """
+    if not isinstance(raw.dtype, pd.CategoricalDtype):
+        raw = raw.astype('category')
+    names = pd.Index(raw.cat.categories, dtype=object)
+    key_codes, _ = pd.factorize(normalize_vendor_names(names))
+    codes = raw.cat.codes.to_numpy()
+    frequency = np.bincount(codes[codes >= 0], minlength=len(names))
+
+    # Per key, the spelling with the most rows (ties: the first in sort order)
+    spellings = np.flatnonzero(key_codes >= 0)
+    spellings = spellings[np.lexsort((-frequency[spellings], key_codes[spellings]))]
+    first = np.append(True, key_codes[spellings][1:] != key_codes[spellings][:-1])
+    labels = names[spellings[first]].str.strip()
+    order = np.argsort(np.asarray(labels, dtype=object), kind='stable')
+    key_label = np.empty(len(order), dtype=np.int64)
+    key_label[order] = np.arange(len(order))
+
+    name_codes = np.where(key_codes >= 0, key_label[np.maximum(key_codes, 0)], -1)
+    row_codes = np.where(codes >= 0, name_codes[codes], -1)
+    return pd.Categorical.from_codes(row_codes, categories=pd.Index(labels[order], dtype=object), validate=False)
+
+
+def align_vendor_names(known, names):
+    """names (a vendor_name categorical) relabelled with the known label of each vendor.
+
+    A vendor is matched by canonical key, so rows added later group with the
+    vendor they name whatever their spelling; vendors not in known keep
+    their own label.
+    """
+    names = pd.Categorical(names)
+    known = pd.Index(known, dtype=object)
+    categories = pd.Index(names.categories, dtype=object)
+    position = pd.Index(normalize_vendor_names(known)).get_indexer(normalize_vendor_names(categories))
+    labels = np.asarray(categories, dtype=object).copy()
+    labels[position >= 0] = known[position[position >= 0]]
+    codes, uniques = pd.factorize(labels)
+    row_codes = names.codes
+    return pd.Categorical.from_codes(np.where(row_codes >= 0, codes[row_codes], -1),
+                                     categories=pd.Index(uniques, dtype=object), validate=False)
+
+
+def _trigrams(names):
+    """(trigram code, name position) of every trigram of ' name ', for normalized names"""
+    padded = [f' {name} '.encode('ascii') for name in names]
+    lengths = np.array([len(text) for text in padded], dtype=np.int64)
+    chars = _CHAR_CODE[np.frombuffer(b''.join(padded), dtype=np.uint8)]
+    owner = np.repeat(np.arange(len(padded)), lengths)
+    # A trigram starts at every character but the last two of each name
+    last = np.cumsum(lengths)
+    starts = np.ones(len(chars), dtype=bool)
+    starts[np.concatenate([last - 1, last - 2])] = False
+    starts = np.flatnonzero(starts)
+    n = len(NAME_ALPHABET)
+    codes = (chars[starts] * n + chars[starts + 1]) * n + chars[starts + 2]
+    return codes, owner[starts]
+
+
+class VendorSearchIndex:
+    """Typeahead over vendor names, matched by canonical key.
+
+    Every word-start suffix of every name sits in one sorted byte-string
+    array, so a prefix at any word boundary is two binary searches; trigram
+    posting lists catch misspellings. Built from the distinct names only,
+    so its size follows the vendor count, not the row count.
+    """
+
+    def __init__(self, names, spend, count):
+        self.names = np.asarray(names, dtype=object)  # vendor ID -> display name
+        self.spend = spend                            # total spend per vendor ID
+        self.count = count                            # transactions per vendor ID
+        # Queries are matched against each name's canonical key
+        self.keys = np.asarray(normalize_vendor_names(names), dtype=object)
+        known = np.flatnonzero(~pd.isna(self.keys))
+
+        # Keys as a fixed-width byte matrix; a word starts at 0 and after each space
+        text = self.keys[known].astype(bytes)
+        width = text.dtype.itemsize
+        chars = np.zeros((len(text), 2 * width), dtype=np.uint8)
+        chars[:, :width] = text.view(np.uint8).reshape(len(text), width)
+        word_start = chars[:, :width] != 0
+        word_start[:, 1:] &= chars[:, :width - 1] == ord(' ')
+        rows, offsets = np.nonzero(word_start)
+        suffixes = chars[rows[:, None], offsets[:, None] + np.arange(width)].view(f'S{width}').ravel()
+        order = np.argsort(suffixes, kind='stable')
+        self.suffixes = suffixes[order]
+        self.suffix_owner = known[rows][order]
+        self.suffix_is_name = offsets[order] == 0  # the suffix is the whole name
+
+        # Trigram -> vendor IDs, as one CSR-style posting array
+        codes, owner = _trigrams(self.keys[known])
+        pairs = np.sort(codes * len(self.names) + known[owner])
+        pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]
+        gram, vendor = np.divmod(pairs, len(self.names))
+        self.gram_start = np.searchsorted(gram, np.arange(len(NAME_ALPHABET) ** 3 + 1))
+        self.gram_vendor = vendor
+        self.gram_count = np.bincount(vendor, minlength=len(self.names))
+
+    @classmethod
+    def from_snapshot(cls, names, cube):
+        """Index over a snapshot's vendor names (its vendor_name categories) with spend from its cube"""
+        spend, count, _ = cube.totals_by('vendor')
+        position = pd.Index(cube.labels['vendor']).get_indexer(names)
+        found = position >= 0
+        return cls(names,
+                   np.where(found, spend[position], 0.0),
+                   np.where(found, count[position], 0))
+
+    def _ranked(self, ids, limit):
+        """ids ordered by spend, largest first, cut to limit"""
+        if len(ids) > limit:
+            ids = ids[np.argpartition(-self.spend[ids], limit - 1)[:limit]]
+        return ids[np.argsort(-self.spend[ids], kind='stable')]
+
+    def prefix(self, key):
+        """Vendor IDs with a word starting with key, and a mask of those whose name does"""
+        query = key.encode('ascii')
+        upper = query[:-1] + bytes([query[-1] + 1])
+        lo, hi = np.searchsorted(self.suffixes, [query, upper])
+        ids = np.unique(self.suffix_owner[lo:hi])
+        return ids, np.isin(ids, self.suffix_owner[lo:hi][self.suffix_is_name[lo:hi]])
+
+    def fuzzy(self, key):
+        """(vendor IDs, trigram similarity) of names resembling key, best first"""
+        codes, _ = _trigrams([key])
+        codes = np.unique(codes)
+        postings = [self.gram_vendor[self.gram_start[code]:self.gram_start[code + 1]] for code in codes]
+        if not postings:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        ids = np.flatnonzero(shared)
+        score = shared[ids] / (len(codes) + self.gram_count[ids] - shared[ids])
+        keep = score >= FUZZY_MIN_SCORE
+        ids, score = ids[keep], score[keep]
+        order = np.lexsort((-self.spend[ids], -score))
+        return ids[order], score[order]
+
+    def search(self, query, limit=10):
+        """Best vendors for a typeahead query: name prefixes first, then fuzzy matches.
+
+        Prefix matches rank names that start with the query above names with
+        a later word starting with it, each by spend.
+        """
+        key = normalize_vendor_name(query)
+        if not isinstance(key, str):
+            return []
+        matches, starts = self.prefix(key)
+        results = []
+        for ids in (matches[starts], matches[~starts]):
+            for vendor_id in self._ranked(ids, limit - len(results)):
+                results.append((vendor_id, 'prefix', 1.0))
+            if len(results) >= limit:
+                break
+        if len(results) < limit:
+            seen = set(matches.tolist())
+            fuzzy_ids, scores = self.fuzzy(key)
+            for vendor_id, score in zip(fuzzy_ids.tolist(), scores.tolist()):
+                if vendor_id not in seen:
+                    results.append((vendor_id, 'fuzzy', score))
+                    if len(results) >= limit:
+                        break
+        return [
+            {
+                'id': int(vendor_id),
+                'name': self.names[vendor_id],
+                'spend': float(self.spend[vendor_id]),
+                'transactions': int(self.count[vendor_id]),
+                'match': match,
+                'score': round(score, 3),
+            } for vendor_id, match, score in results
+        ]